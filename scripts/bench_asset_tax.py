@@ -0,0 +1,93 @@
+"""
+每日资产税基准：默认 100k 个合成用户，对比原先逐个加载 ORM 对象计算的做法与 roll.daily_asset_tax。
+
+输出耗时与执行的 SQL 语句数，并校验两种方式扣税后的余额与税收总额一致。
+用法：python scripts/bench_asset_tax.py [用户数]
+"""
+import random
+import sys
+import time
+from math import ceil
+
+import benchlib
+from sqlalchemy import event
+from sqlmodel import select, insert, func
+
+from src.plugins.axekz.core import BANK_QID, ledger
+from src.plugins.axekz.core.db.deps import new_session
+from src.plugins.axekz.core.db.models import User, BankShard, CoinTransaction, TransactionType
+from src.plugins.axekz.plugins import roll
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+
+async def legacy_daily_asset_tax():
+    """原 daily_asset_tax：加载全部用户，在 Python 中计算并逐个写回"""
+    async with new_session() as session:
+        users = (await session.exec(select(User).where(User.qid != BANK_QID))).all()
+        tax_records = []
+        total_tax = 0
+        for user in users:
+            if user.coins < 1:
+                continue
+            tax_amount = ceil(user.coins / 1000)
+            total_tax += tax_amount
+            user.coins -= tax_amount
+            tax_records.append(CoinTransaction(
+                user_id=user.qid, amount=-tax_amount, type=TransactionType.TAX,
+                description=f"每日资产税收: {tax_amount}",
+            ))
+            session.add(user)
+        await ledger.credit_bank(session, total_tax)
+        tax_records.append(CoinTransaction(
+            user_id=ledger.BANK_LEDGER_ID, amount=total_tax, type=TransactionType.TAX,
+            description=f"每日资产税收汇总收入，共 {total_tax} 硬币",
+        ))
+        session.add_all(tax_records)
+        await session.commit()
+
+
+async def measure(name, job, coins):
+    engine = benchlib.use_sqlite()
+    await benchlib.create_tables(engine)
+    async with new_session() as session:
+        session.add(User(qid=BANK_QID, steamid='bank', coins=0))
+        session.add_all([BankShard(shard=i) for i in range(16)])
+        for start in range(0, len(coins), 5000):
+            await session.exec(insert(User).values([
+                dict(qid=str(i), steamid=f's{i}', coins=c) for i, c in enumerate(coins[start:start + 5000], start)
+            ]))
+        await session.commit()
+
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    await job()
+    elapsed = time.perf_counter() - started
+    event.remove(engine.sync_engine, 'before_cursor_execute', count)
+
+    async with new_session() as session:
+        balances = (await session.exec(select(User.coins).where(User.qid != BANK_QID).order_by(User.qid))).all()
+        bank = await ledger.get_bank_balance(session)
+        ledger_rows = (await session.exec(select(func.count()).select_from(CoinTransaction))).one()
+    await engine.dispose()
+    print(f"{name:<18} {elapsed:>7.2f} s  {statements:>7} statements  {ledger_rows:>7} ledger rows  bank {bank}")
+    return balances, bank
+
+
+async def main():
+    random.seed(0)
+    coins = [random.choice([0, 1, 999, 1000, 1001, random.randint(0, 200_000)]) for _ in range(USERS)]
+    print(f"{USERS:,} users")
+    before = await measure('legacy ORM loop', legacy_daily_asset_tax, coins)
+    after = await measure('daily_asset_tax', roll.daily_asset_tax, coins)
+    print('results match:', before == after)
+
+
+if __name__ == '__main__':
+    benchlib.run(main)
@@ -0,0 +1,144 @@
+"""
+事件循环延迟基准：并发的 /qd、/give 数据库负载下，对比同步 Session 与 AsyncSession。
+
+数据库换成 SQLite 文件库，每条语句前执行一次 sleep_ms 模拟 MySQL 往返延迟（在数据库驱动所在线程中阻塞）。
+同时运行一个每 1ms 醒来一次的探针协程，记录它被推迟的时间，即其它群消息要等待的时间。
+用法：python scripts/bench_event_loop_lag.py [往返毫秒数]
+"""
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import benchlib
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, select, update, insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.plugins.axekz.core.db.models import User, Sign, CoinTransaction, TransactionType
+
+LATENCY_MS = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+USERS = 50
+COMMANDS_PER_USER = 10
+
+
+def statements(command: str, qid: str, other: str, amount: int) -> list:
+    """/qd 与 /give 处理过程中依次执行的语句"""
+    transfer = [
+        update(User).where(User.qid == other, User.coins >= amount).values(coins=User.coins - amount),
+        update(User).where(User.qid == qid).values(coins=User.coins + amount),
+        insert(CoinTransaction).values([
+            dict(user_id=other, amount=-amount, type=TransactionType.SIGN, description='bench'),
+            dict(user_id=qid, amount=amount, type=TransactionType.SIGN, description='bench'),
+        ]),
+        select(User.qid, User.coins).where(User.qid.in_([qid, other])),
+    ]
+    if command == 'give':
+        return [select(User).where(User.qid == qid)] + transfer
+    return [
+        select(User).where(User.qid == qid),
+        select(Sign).where(Sign.qid == qid, Sign.signed_at >= date.today()),
+        select(User).where(User.coins >= 100).order_by(User.coins.desc()).limit(3),
+        *transfer,
+        insert(Sign).values(qid=qid, earned_coins=amount),
+    ]
+
+
+def workload(seed: int) -> list[list[tuple[str, str, str, int]]]:
+    """每位用户依次发送的命令"""
+    rng = random.Random(seed)
+    return [
+        [(rng.choice(('qd', 'give')), str(u), str(rng.randrange(USERS)), rng.randint(1, 30))
+         for _ in range(COMMANDS_PER_USER)]
+        for u in range(USERS)
+    ]
+
+
+ROUND_TRIP = text("SELECT sleep_ms(:ms)").bindparams(ms=LATENCY_MS)
+
+
+def run_sync(engine, command):
+    with Session(engine) as session:
+        for statement in statements(*command):
+            session.exec(ROUND_TRIP)
+            session.exec(statement)
+        session.exec(ROUND_TRIP)
+        session.commit()
+
+
+async def run_async(engine, command):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        for statement in statements(*command):
+            await session.exec(ROUND_TRIP)
+            await session.exec(statement)
+        await session.exec(ROUND_TRIP)
+        await session.commit()
+
+
+async def probe(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def measure(name: str, handle, commands):
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.01)
+
+    async def user(user_commands):
+        # 每位用户收到回复后再发下一条
+        for command in user_commands:
+            await asyncio.sleep(0)
+            await handle(command)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(user_commands) for user_commands in commands))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    p99 = lags_ms[int(len(lags_ms) * 0.99) - 1]
+    print(f"{name:<13} wall {elapsed:6.2f} s   loop lag median {statistics.median(lags_ms):7.2f} ms"
+          f"   p99 {p99:8.2f} ms   max {lags_ms[-1]:8.2f} ms")
+
+
+def seed_database(path: Path):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.exec(insert(User).values([dict(qid=str(i), steamid=f's{i}', coins=10_000) for i in range(USERS)]))
+        session.commit()
+    engine.dispose()
+
+
+async def main():
+    commands = workload(0)
+    print(f"{USERS * COMMANDS_PER_USER} commands from {USERS} concurrent users, {LATENCY_MS} ms per round trip")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('sync Session', 'AsyncSession'):
+            path = Path(tmp) / f"{name.split()[0]}.db"
+            seed_database(path)
+            if name == 'sync Session':
+                engine = create_engine(f"sqlite:///{path}", connect_args={'timeout': 30})
+                event.listen(engine, 'connect', benchlib.register_functions)
+                # 与原先的处理函数一样，在事件循环线程里同步执行查询
+                await measure(name, lambda command: asyncio.sleep(0, run_sync(engine, command)), commands)
+                engine.dispose()
+            else:
+                # 单连接，避免 SQLite 多连接写锁冲突；等待连接的协程不占用事件循环
+                engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=1, max_overflow=0, pool_timeout=600)
+                event.listen(engine.sync_engine, 'connect', benchlib.register_functions)
+                await measure(name, lambda command: run_async(engine, command), commands)
+                await engine.dispose()
+
+
+if __name__ == '__main__':
+    benchlib.run(main)
@@ -0,0 +1,71 @@
+"""
+HTTP 连接复用基准：在本地启动 aiohttp 替身服务，对比每次请求新建 ClientSession 与 helpers.aio_get 的共享会话。
+
+输出顺序请求与并发请求的平均延迟。
+"""
+import asyncio
+import time
+
+import aiohttp
+import benchlib
+from aiohttp import web
+
+from src.plugins.axekz.core.utils import helpers
+
+REQUESTS = 500
+CONCURRENCY = 20
+
+
+async def legacy_get(url):
+    """原 aio_get：每次请求新建会话和连接器"""
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=helpers.context)) as session:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+            return await response.json()
+
+
+async def pooled_get(url):
+    return await helpers.aio_get(url, coalesce=False)
+
+
+async def sequential(get, url) -> float:
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        await get(url)
+    return (time.perf_counter() - started) / REQUESTS
+
+
+async def concurrent(get, url) -> float:
+    latencies = []
+
+    async def worker():
+        for _ in range(REQUESTS // CONCURRENCY):
+            started = time.perf_counter()
+            await get(url)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return sum(latencies) / len(latencies)
+
+
+async def main():
+    app = web.Application()
+    app.router.add_get('/ping', lambda request: web.json_response({'ok': True}))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f'http://127.0.0.1:{port}/ping'
+
+    for name, get in (('new session per call', legacy_get), ('shared session', pooled_get)):
+        await get(url)  # 预热
+        seq = await sequential(get, url)
+        conc = await concurrent(get, url)
+        print(f"{name:<22} sequential {seq * 1000:6.2f} ms   {CONCURRENCY} concurrent {conc * 1000:6.2f} ms")
+
+    await helpers.close_sessions()
+    await runner.cleanup()
+
+
+if __name__ == '__main__':
+    benchlib.run(main)
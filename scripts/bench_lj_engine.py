@@ -0,0 +1,25 @@
+"""本地 LJ 引擎的采样速度：按不同批量生成样本，输出每秒样本数"""
+import benchlib
+import numpy as np
+
+from src.plugins.axekz.core import lj_engine
+
+
+def main():
+    rng = np.random.default_rng(0)
+    x = rng.multivariate_normal([250, 276, 300, 6, 80], np.diag([36, 16, 64, 2.25, 36]), size=5000)
+    jumpstats = [{'Distance': d, 'Pre': p, 'Max': m, 'Strafes': round(s), 'Sync': y} for d, p, m, s, y in x]
+
+    engine = lj_engine.LJEngine(seed=0)
+    engine.fit('kzt', jumpstats)
+
+    for n in (2, 100, 10_000, 1_000_000):
+        seconds = benchlib.best_of(lambda: engine.sample_array('kzt', n))
+        print(f"sample_array n={n:>9,}: {n / seconds:>14,.0f} samples/s")
+    for n in (2, 10_000):
+        seconds = benchlib.best_of(lambda: engine.sample('kzt', n))
+        print(f"sample       n={n:>9,}: {n / seconds:>14,.0f} samples/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+GlobalAPI 成绩流式解析的内存基准：本地替身服务返回 10k 条 records/top 格式的记录，
+用 tracemalloc 对比 response.json() 整体解析与 helpers.aio_get_records 只保留镜像字段的峰值内存。
+"""
+import json
+import random
+import tracemalloc
+
+import benchlib
+from aiohttp import web
+
+from src.plugins.axekz.core.utils import helpers
+from src.plugins.axekz.core.utils.globalapi import MIRROR_FIELDS
+
+RECORDS = 10_000
+
+
+def make_records() -> list[dict]:
+    random.seed(0)
+    return [
+        {
+            'id': i, 'steamid64': '76561198000000001', 'player_name': '玩家', 'steam_id': 'STEAM_1:1:19867136',
+            'server_id': random.choice([1683, 1633, 1393, 5]), 'map_id': i, 'stage': 0, 'mode': 'kz_timer',
+            'tickrate': 128, 'time': round(random.uniform(30, 900), 3), 'teleports': random.randint(0, 5),
+            'created_on': '2024-01-01T00:00:00', 'updated_on': '2024-01-01T00:00:00', 'updated_by': 0,
+            'record_filter_id': 1, 'server_name': 'AXE KZ 服务器', 'map_name': f'kz_map_{i}',
+            'points': random.randint(0, 1000), 'replay_id': 0,
+        }
+        for i in range(RECORDS)
+    ]
+
+
+async def peak(coro) -> tuple[object, int]:
+    tracemalloc.start()
+    result = await coro
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak_bytes
+
+
+async def main():
+    records = make_records()
+    body = json.dumps(records, ensure_ascii=False).encode()
+
+    app = web.Application()
+    app.router.add_get('/records', lambda request: web.Response(body=body, content_type='application/json'))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/records"
+
+    await helpers.aio_get_records(url, MIRROR_FIELDS)  # 预热连接
+    full, full_peak = await peak(helpers.aio_get(url, timeout=30, coalesce=False))
+    del full
+    rows, stream_peak = await peak(helpers.aio_get_records(url, MIRROR_FIELDS))
+
+    print(f"body {len(body) / 1024:,.0f} KB, {RECORDS:,} records")
+    print(f"response.json()   peak {full_peak / 1024:>8,.0f} KB")
+    print(f"aio_get_records   peak {stream_peak / 1024:>8,.0f} KB")
+    print('output matches:', rows == [tuple(record[field] for field in MIRROR_FIELDS) for record in records])
+
+    await helpers.close_sessions()
+    await runner.cleanup()
+
+
+if __name__ == '__main__':
+    benchlib.run(main)
@@ -0,0 +1,72 @@
+"""
+群聊刷屏基准：普通群消息（非回复）经过 accept_game / claim_handler 的单条开销。
+
+对比原先无 Rule、每条消息都注入 AsyncSessionDep 再在处理函数里提前返回的写法，
+与现在 reply_to_tracked 在依赖注入之前拒绝的写法。两者都走 NoneBot 的 check_and_run_matcher，
+另外单独给出 Rule 中判定函数本身的耗时，其余部分是 NoneBot 对每个 matcher 都有的调度开销。
+"""
+import time
+
+import benchlib
+import nonebot
+from nonebot.adapters.onebot.v11 import Adapter, Bot, GroupMessageEvent, Message
+from nonebot.message import check_and_run_matcher
+from nonebot.plugin import on_message
+
+from src.plugins.axekz.core.db.deps import AsyncSessionDep
+from src.plugins.axekz.plugins.coins import claim_handler
+from src.plugins.axekz.plugins.long_jump import accept_game
+
+MESSAGES = 20_000
+
+legacy_matcher = on_message(priority=2, block=False)
+
+
+@legacy_matcher.handle()
+async def _(bot: Bot, event: GroupMessageEvent, session: AsyncSessionDep):
+    # 原 accept_game 的开头：不是回复机器人的消息直接返回
+    if not event.reply or event.reply.sender.user_id != int(bot.self_id):
+        return None
+
+
+def make_event(i: int) -> GroupMessageEvent:
+    text = f'随便聊聊 {i}'
+    return GroupMessageEvent.model_validate(dict(
+        time=0, self_id=1, post_type='message', sub_type='normal', message_type='group',
+        message_id=i, user_id=10_000 + i % 50, group_id=188099455, font=0, to_me=False,
+        message=Message(text), original_message=Message(text), raw_message=text,
+        sender={'user_id': 10_000 + i % 50},
+    ))
+
+
+async def per_message(matchers, bot, events) -> float:
+    started = time.perf_counter()
+    for event in events:
+        for matcher in matchers:
+            await check_and_run_matcher(matcher, bot, event, {})
+    return (time.perf_counter() - started) / len(events)
+
+
+async def main():
+    engine = benchlib.use_sqlite()
+    bot = Bot(nonebot.get_adapter(Adapter), '1')
+    events = [make_event(i) for i in range(MESSAGES)]
+
+    before = await per_message([legacy_matcher, legacy_matcher], bot, events)
+    after = await per_message([accept_game, claim_handler], bot, events)
+    checkers = [next(iter(matcher.rule.checkers)).call for matcher in (accept_game, claim_handler)]
+    started = time.perf_counter()
+    for event in events:
+        for checker in checkers:
+            await checker(event)
+    predicate = (time.perf_counter() - started) / len(events)
+    print(f"{MESSAGES:,} non-reply group messages, two reply matchers each")
+    print(f"session dependency + early return  {before * 1e6:8.1f} us/message")
+    print(f"reply_to_tracked rule              {after * 1e6:8.1f} us/message")
+    print(f"  of which the rule predicates     {predicate * 1e6:8.1f} us/message")
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    nonebot.get_driver().register_adapter(Adapter)
+    benchlib.run(main)
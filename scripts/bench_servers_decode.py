@@ -0,0 +1,48 @@
+"""
+/servers/ 解析基准：20 台服务器、每台 20 名玩家（共 400 名）的响应，
+对比完整模型 ServersInfo 与精简模型 ServersBrief 的解析耗时。
+"""
+import random
+
+import benchlib
+
+from src.plugins.axekz.core.dataclasses.servers import parse_servers_info
+
+SERVERS = 20
+PLAYERS_PER_SERVER = 20
+
+
+def make_payload() -> list[dict]:
+    random.seed(0)
+    return [
+        {
+            'server_name': f'AXE KZ #{s}', 'map': f'kz_map_{s}', 'tier': random.randint(1, 7),
+            'player_count': PLAYERS_PER_SERVER, 'max_players': 24, 'bot_count': 0,
+            'address': f'203.0.113.{s}:27015',
+            'players': [
+                {
+                    'name': f'player{s}_{p}', 'steamid': 'STEAM_1:1:19867136', 'steamid32': 39734273,
+                    'steamid64': '76561198000000001', 'duration': '00:42:17', 'ping': random.randint(5, 200),
+                    'loss': 0, 'state': 'active', 'rate': 786432, 'ip': f'10.0.{s}.{p + 1}',
+                }
+                for p in range(PLAYERS_PER_SERVER)
+            ],
+        }
+        for s in range(SERVERS)
+    ]
+
+
+def main():
+    data = make_payload()
+    full = parse_servers_info(data, lean=False)
+    lean = parse_servers_info(data, lean=True)
+    assert [p.name for s in full.servers for p in s.players] == [p.name for s in lean.servers for p in s.players]
+
+    print(f"{SERVERS} servers / {SERVERS * PLAYERS_PER_SERVER} players")
+    for name, is_lean in (('ServersInfo (full)', False), ('ServersBrief (lean)', True)):
+        seconds = benchlib.best_of(lambda: [parse_servers_info(data, lean=is_lean) for _ in range(100)]) / 100
+        print(f"{name:<20} {seconds * 1000:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+赛事结算基准：10k 条投注（2k 用户、30 个选项）下，对比原 /checkout 的逐条处理与 betting.settle_event。
+
+输出耗时与执行的 SQL 语句数，并校验两种方式入账的余额一致。
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import benchlib
+from sqlalchemy import event
+from sqlmodel import select, insert, func
+
+from src.plugins.axekz.core import betting
+from src.plugins.axekz.core.db.deps import new_session
+from src.plugins.axekz.core.db.models import User, BetEvent, BetOption, BetRecord, CoinTransaction
+
+USERS = 2000
+OPTIONS = 30
+BETS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+WINNER = 7
+
+
+async def legacy_checkout(session, event_id: int, option_id: int):
+    """原 /checkout 的结算流程（改写为异步），每条投注单独读取用户"""
+    bet_event = await session.get(BetEvent, event_id)
+    bet_event.result_option_id = option_id
+    total_bets = (await session.exec(select(func.sum(BetRecord.bet_amount)).where(BetRecord.event_id == event_id))).one()
+    winning_bets = (await session.exec(select(func.sum(BetRecord.bet_amount)).where(
+        BetRecord.option_id == option_id, BetRecord.event_id == event_id))).one()
+    odds = total_bets / winning_bets
+    net_wins = {}
+    for bet_ in (await session.exec(select(BetRecord).where(
+            BetRecord.option_id == option_id, BetRecord.event_id == event_id))).all():
+        user = await session.get(User, bet_.user_id)
+        win_amount = bet_.bet_amount * odds
+        user.coins += int(win_amount)
+        session.add(user)
+        net_wins[user.qid] = net_wins.get(user.qid, 0) + win_amount - bet_.bet_amount
+    for bet_ in (await session.exec(select(BetRecord).where(
+            BetRecord.option_id != option_id, BetRecord.event_id == event_id))).all():
+        user = await session.get(User, bet_.user_id)
+        net_wins[user.qid] = net_wins.get(user.qid, 0) - bet_.bet_amount
+    await session.commit()
+    for user_id, _ in sorted(net_wins.items(), key=lambda x: x[1], reverse=True):
+        await session.get(User, user_id)
+
+
+async def seed(records: dict[tuple[str, int], int]):
+    engine = benchlib.use_sqlite()
+    await benchlib.create_tables(engine)
+    async with new_session() as session:
+        await session.exec(insert(User).values([
+            dict(qid=str(i), steamid=f's{i}', nickname=f'user{i}', coins=0) for i in range(USERS)
+        ]))
+        session.add(BetEvent(id=1, name='bench', end_time=datetime.now() + timedelta(days=1)))
+        await session.exec(insert(BetOption).values([
+            dict(option_id=o, event_id=1, option_name=f'option{o}', qid=str(o), steamid='s', is_cancelled=False)
+            for o in range(1, OPTIONS + 1)
+        ]))
+        await session.exec(insert(BetRecord).values([
+            dict(user_id=qid, event_id=1, option_id=option_id, bet_amount=amount)
+            for (qid, option_id), amount in records.items()
+        ]))
+        await session.commit()
+    return engine
+
+
+async def measure(name, settle, records):
+    engine = await seed(records)
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', count)
+    async with new_session() as session:
+        started = time.perf_counter()
+        await settle(session)
+        elapsed = time.perf_counter() - started
+    event.remove(engine.sync_engine, 'before_cursor_execute', count)
+
+    async with new_session() as session:
+        balances = dict((await session.exec(select(User.qid, User.coins).where(User.coins > 0))).all())
+        ledger_rows = (await session.exec(select(func.count()).select_from(CoinTransaction))).one()
+    await engine.dispose()
+    print(f"{name:<14} {elapsed * 1000:>9.1f} ms  {statements:>6} statements  {ledger_rows:>5} ledger rows")
+    return balances
+
+
+async def main():
+    random.seed(0)
+    records = {}
+    while len(records) < BETS:
+        records[(str(random.randrange(USERS)), random.randint(1, OPTIONS))] = random.randint(1, 500)
+
+    async def settle(session):
+        await betting.settle_event(session, 1, WINNER)
+        await session.commit()
+
+    print(f"{BETS:,} bets, {USERS:,} users, {OPTIONS} options")
+    before = await measure('legacy loop', lambda session: legacy_checkout(session, 1, WINNER), records)
+    after = await measure('settle_event', settle, records)
+    print('balances match:', before == after)
+
+
+if __name__ == '__main__':
+    benchlib.run(main)
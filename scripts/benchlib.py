@@ -0,0 +1,61 @@
+"""基准脚本的公共部分
+
+以 none 驱动初始化 NoneBot 并加载 axekz，提供内存/文件 SQLite 引擎与计时工具。
+脚本在仓库根目录执行：python scripts/bench_xxx.py
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import nonebot  # noqa: E402
+
+nonebot.init(
+    driver="~none", log_level="ERROR",
+    db_host="localhost", db_port=3306, db_user="bench", db_password="bench", db_name="bench", token="bench",
+)
+nonebot.load_plugin("nonebot_plugin_apscheduler")
+nonebot.load_plugin("src.plugins.axekz")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from src.plugins.axekz.core.db import deps  # noqa: E402
+
+
+def register_functions(dbapi_connection, connection_record=None):
+    # MySQL 内置而 SQLite 没有的函数；sleep_ms 用于模拟数据库往返延迟，在 SQLite 所在线程中阻塞
+    dbapi_connection.create_function("concat", -1, lambda *args: "".join(str(arg) for arg in args))
+    dbapi_connection.create_function("sleep_ms", 1, lambda ms: time.sleep(ms / 1000))
+
+
+def use_sqlite(url: str = "sqlite+aiosqlite://") -> AsyncEngine:
+    """把 axekz 的数据库换成 SQLite，默认内存库"""
+    kwargs = {'poolclass': StaticPool} if url.endswith("://") else {'connect_args': {'timeout': 30}}
+    engine = create_async_engine(url, **kwargs)
+    event.listen(engine.sync_engine, "connect", register_functions)
+    deps.engine = engine
+    return engine
+
+
+async def create_tables(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """多次运行取最短耗时（秒）"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(main):
+    return asyncio.run(main())
@@ -14,10 +14,13 @@ class Config(BaseModel):
     db_password: str
     db_name: str
     token: str
+    # LJPK 使用本地模拟引擎，不再请求 /casual/lj
+    lj_engine: bool = False
+    lj_engine_seed: int | None = None
 
     def get_connection_string(self) -> str:
         encoded_password = quote_plus(self.db_password)
         return (
-            f"mysql+pymysql://{self.db_user}:{encoded_password}@"
+            f"mysql+asyncmy://{self.db_user}:{encoded_password}@"
             f"{self.db_host}:{self.db_port}/{self.db_name}"
         )
@@ -0,0 +1,317 @@
+"""赛事投注奖池与结算
+
+每个赛事的选项与各选项投注总额缓存在内存中，首次读取时用一条 GROUP BY 查询加载，
+之后由 /bet 在投注成功后增量更新，/bet_info 直接从内存计算赔率。
+结算 settle_event 全部用集合 SQL 完成，语句数与投注数量无关。
+当前进行中的赛事由 get_active_event 缓存，到下一个开始/结束时间点或写入赛事、选项时失效，
+缓存同时带有选项昵称索引，/bet 按昵称投注时不再查询数据库。
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from pypinyin import lazy_pinyin, Style
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlmodel import select, update, insert, func, case, literal
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import capitalists
+from .db.models import BetEvent, BetOption, BetRecord, CoinTransaction, TransactionType, User
+
+
+@dataclass
+class BetPool:
+    # option_id -> option_name，按 option_id 排序
+    options: dict[int, str]
+    totals: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return sum(self.totals.values())
+
+    def odds(self) -> list[dict]:
+        """各选项的投注总额与赔率，有投注的按赔率从低到高排在前面"""
+        total = self.total
+        odds_list = []
+        for option_id, name in self.options.items():
+            option_bets = self.totals.get(option_id, 0)
+            odds_list.append({
+                'id': option_id,
+                'name': name,
+                'odds': total / option_bets if option_bets > 0 else 0,
+                'option_bets': option_bets,
+            })
+        return sorted(odds_list, key=lambda x: (x['odds'] == 0, x['odds']))
+
+
+_pools: dict[int, BetPool] = {}
+# 每次写入都会递增，加载期间发生写入时丢弃加载结果，避免缓存旧数据
+_generations: dict[int, int] = defaultdict(int)
+
+
+async def load_pool(session: AsyncSession, event_id: int) -> BetPool:
+    generation = _generations[event_id]
+    options = (await session.exec(
+        select(BetOption.option_id, BetOption.option_name)
+        .where(BetOption.event_id == event_id)
+        .order_by(BetOption.option_id)
+    )).all()
+    totals = (await session.exec(
+        select(BetRecord.option_id, func.sum(BetRecord.bet_amount))
+        .where(BetRecord.event_id == event_id)
+        .group_by(BetRecord.option_id)
+    )).all()
+    pool = BetPool(options=dict(options), totals={option_id: int(amount) for option_id, amount in totals})
+    if _generations[event_id] == generation:
+        _pools[event_id] = pool
+    return pool
+
+
+async def get_pool(session: AsyncSession, event_id: int) -> BetPool:
+    pool = _pools.get(event_id)
+    if pool is None:
+        pool = await load_pool(session, event_id)
+    return pool
+
+
+def record_bet(event_id: int, option_id: int, amount: int):
+    """投注提交后调用"""
+    _generations[event_id] += 1
+    pool = _pools.get(event_id)
+    if pool is not None:
+        pool.totals[option_id] = pool.totals.get(option_id, 0) + amount
+
+
+def invalidate_pool(event_id: int):
+    """选项变动（报名、取消）后调用"""
+    _generations[event_id] += 1
+    _pools.pop(event_id, None)
+
+
+def _initials(name: str) -> str:
+    return ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).casefold()
+
+
+class OptionNameIndex:
+    """选手昵称索引：完全匹配优先，其次忽略大小写的子串匹配，最后匹配中文昵称的拼音首字母"""
+
+    def __init__(self, options: Iterable[BetOption] = ()):
+        self._entries: list[tuple[str, str, BetOption]] = []
+        for option in options:
+            self.add(option)
+
+    def add(self, option: BetOption):
+        if option.is_cancelled or any(entry[2].option_id == option.option_id for entry in self._entries):
+            return
+        self._entries.append((option.option_name.casefold(), _initials(option.option_name), option))
+
+    def match(self, query: str) -> list[BetOption]:
+        query = query.casefold()
+        exact = [option for name, _, option in self._entries if name == query]
+        if exact:
+            return exact
+        found = [option for name, _, option in self._entries if query in name]
+        if found or not query.isascii():
+            return found
+        return [option for _, initials, option in self._entries if query in initials]
+
+
+# 赛事可能在机器人之外被修改，缓存最长保留这么久
+ACTIVE_EVENT_MAX_TTL = timedelta(minutes=5)
+
+
+@dataclass
+class ActiveEvent:
+    events: list[BetEvent]
+    # 唯一进行中赛事的选项，option_id -> BetOption
+    options: dict[int, BetOption]
+    expires_at: datetime
+    name_index: OptionNameIndex = field(default_factory=OptionNameIndex)
+
+    @property
+    def current(self) -> BetEvent | None:
+        return self.events[0] if len(self.events) == 1 else None
+
+    @property
+    def error(self) -> str | None:
+        if not self.events:
+            return "当前没有正在进行的赛事"
+        if len(self.events) > 1:
+            return "检测到多个正在进行的赛事，请联系管理员"
+        return None
+
+
+_active: ActiveEvent | None = None
+_active_generation = 0
+
+
+async def get_active_event(session: AsyncSession) -> ActiveEvent:
+    """返回进行中的赛事（按开始时间倒序）及其选项，缓存到下一个开始或结束时间点"""
+    global _active
+    now = datetime.now()
+    if _active is not None and now < _active.expires_at:
+        return _active
+
+    generation = _active_generation
+    events = list((await session.exec(
+        select(BetEvent).where(BetEvent.start_time <= now, BetEvent.end_time > now).order_by(BetEvent.start_time.desc())
+    )).all())
+    next_start = (await session.exec(select(func.min(BetEvent.start_time)).where(BetEvent.start_time > now))).one()
+
+    options = {}
+    if len(events) == 1:
+        options = {option.option_id: option for option in (await session.exec(
+            select(BetOption).where(BetOption.event_id == events[0].id).order_by(BetOption.option_id)
+        )).all()}
+
+    boundaries = [now + ACTIVE_EVENT_MAX_TTL, *(event.end_time for event in events)]
+    if next_start:
+        boundaries.append(next_start)
+    active = ActiveEvent(
+        events=events,
+        options=options,
+        expires_at=min(boundaries),
+        name_index=OptionNameIndex(options.values()),
+    )
+    if generation == _active_generation:
+        _active = active
+    return active
+
+
+def add_active_option(option: BetOption):
+    """报名（含重新激活）提交后调用，就地更新缓存中的选项和昵称索引"""
+    global _active_generation
+    _active_generation += 1
+    current = _active.current if _active is not None else None
+    if current is None or current.id != option.event_id:
+        invalidate_active_event()
+        return
+    _active.options[option.option_id] = option
+    _active.name_index.add(option)
+
+
+def invalidate_active_event():
+    """写入赛事或选项后调用"""
+    global _active, _active_generation
+    _active_generation += 1
+    _active = None
+
+
+class EventAlreadySettled(ValueError):
+    def __init__(self, event_id: int):
+        super().__init__(f"赛事 {event_id} 已经结算")
+        self.event_id = event_id
+
+
+@dataclass
+class SettlementLine:
+    qid: str
+    nickname: str
+    payout: int       # 获胜选项的奖励（含本金）
+    lost: int         # 投在其它选项上输掉的金额
+    net: int          # 本场净输赢
+
+
+@dataclass
+class Settlement:
+    total_bets: int
+    winning_bets: int
+    lines: list[SettlementLine]
+
+
+class _int_div(FunctionElement):
+    """非负整数的整除：MySQL 的 / 结果是按精度舍入的小数，需用 DIV；SQLite 的整数 / 本身即整除"""
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(_int_div, 'mysql')
+def _compile_int_div_mysql(element, compiler, **kw):
+    numerator, denominator = element.clauses
+    return f"(({compiler.process(numerator, **kw)}) DIV ({compiler.process(denominator, **kw)}))"
+
+
+@compiles(_int_div, 'sqlite')
+def _compile_int_div_sqlite(element, compiler, **kw):
+    numerator, denominator = element.clauses
+    return f"(({compiler.process(numerator, **kw)}) / ({compiler.process(denominator, **kw)}))"
+
+
+async def settle_event(session: AsyncSession, event_id: int, option_id: int) -> Settlement | None:
+    """
+    结算赛事：获胜选项的每位投注者获得 floor(投注额 * 总奖池 / 获胜选项奖池)。
+
+    以 result_option_id IS NULL 为条件写入结果，重复结算抛出 EventAlreadySettled；
+    获胜选项无人投注时返回 None 且不做任何修改。由调用方提交。
+    """
+    won = BetRecord.option_id == option_id
+    total_bets, winning_bets = (await session.exec(
+        select(
+            func.coalesce(func.sum(BetRecord.bet_amount), 0),
+            func.coalesce(func.sum(case((won, BetRecord.bet_amount), else_=0)), 0),
+        ).where(BetRecord.event_id == event_id)
+    )).one()
+    total_bets, winning_bets = int(total_bets), int(winning_bets)
+    if winning_bets == 0:
+        return None
+
+    claimed = await session.exec(
+        update(BetEvent)
+        .where(BetEvent.id == event_id, BetEvent.result_option_id.is_(None))
+        .values(result_option_id=option_id, result_event_id=event_id)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        raise EventAlreadySettled(event_id)
+
+    payout = _int_div(func.sum(BetRecord.bet_amount) * total_bets, winning_bets)
+    payouts = (
+        select(BetRecord.user_id.label('user_id'), payout.label('payout'))
+        .where(BetRecord.event_id == event_id, won)
+        .group_by(BetRecord.user_id)
+        .subquery()
+    )
+
+    await session.exec(
+        update(User)
+        .where(User.qid == payouts.c.user_id)
+        .values(coins=User.coins + payouts.c.payout)
+        .execution_options(synchronize_session=False)
+    )
+    capitalists.mark_stale(session)
+    await session.exec(
+        insert(CoinTransaction).from_select(
+            ['user_id', 'amount', 'type', 'description', 'created_at'],
+            select(
+                payouts.c.user_id,
+                payouts.c.payout,
+                literal(TransactionType.BET_REWARD, CoinTransaction.__table__.c.type.type),
+                literal(f"赛事 {event_id} 结算，选手 {option_id} 获胜"),
+                func.now(),
+            ).where(payouts.c.payout > 0),
+        )
+    )
+
+    stakes = (await session.exec(
+        select(
+            User.qid,
+            User.nickname,
+            func.sum(case((won, BetRecord.bet_amount), else_=0)),
+            func.sum(case((won, 0), else_=BetRecord.bet_amount)),
+        )
+        .select_from(BetRecord)
+        .join(User, User.qid == BetRecord.user_id)
+        .where(BetRecord.event_id == event_id)
+        .group_by(User.qid, User.nickname)
+    )).all()
+
+    lines = []
+    for qid, nickname, won_stake, lost in stakes:
+        won_stake, lost = int(won_stake), int(lost)
+        reward = won_stake * total_bets // winning_bets
+        lines.append(SettlementLine(qid, nickname, reward, lost, reward - won_stake - lost))
+    lines.sort(key=lambda line: line.net, reverse=True)
+    return Settlement(total_bets, winning_bets, lines)
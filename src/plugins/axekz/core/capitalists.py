@@ -0,0 +1,133 @@
+"""资本家缓存
+
+/qd 从余额最高的 TOP_K 位用户中按权重挑选被吸血的对象。这里在内存中缓存余额最高的一批用户：
+ledger.transfer 把变动后的余额记在会话上，事务提交后才写入缓存；
+税收、赛事结算这类批量改余额的操作提交后让缓存失效，另有定时任务兜底刷新。
+"""
+import heapq
+
+from nonebot_plugin_apscheduler import scheduler
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import BANK_QID
+from .db.deps import new_session
+from .db.models import User
+
+TOP_K = 3
+MIN_COINS = 100
+# 多缓存一些候选，前几名余额下降后不必立即回表
+CANDIDATES = 16
+REFRESH_INTERVAL = 60
+
+_STAGED = 'capitalists.balances'
+_STALE = 'capitalists.stale'
+
+
+class TopCoins:
+    """
+    余额不少于 MIN_COINS 的候选用户，qid -> coins。
+    不在缓存中的用户余额都不超过 floor，因此缓存中至少有 k 人时，前 k 名与数据库排序一致。
+    """
+
+    def __init__(self, rows=(), size: int = CANDIDATES):
+        self.size = size
+        self._coins: dict[str, int] = dict(rows)
+        # 取满 size 人时，其余用户不超过第 size 名；否则所有符合条件的用户都在缓存中
+        self.floor = min(self._coins.values()) if len(self._coins) >= size else MIN_COINS - 1
+
+    def update(self, qid: str, coins: int):
+        if qid == BANK_QID:
+            return
+        if coins > self.floor:
+            self._coins[qid] = coins
+            if len(self._coins) > 2 * self.size:
+                self._trim()
+        else:
+            self._coins.pop(qid, None)
+
+    def _trim(self):
+        kept = heapq.nlargest(self.size, self._coins.items(), key=lambda item: item[1])
+        evicted = self._coins.keys() - {qid for qid, _ in kept}
+        self.floor = max(self.floor, max(self._coins[qid] for qid in evicted))
+        self._coins = dict(kept)
+
+    def top(self, k: int = TOP_K) -> list[str] | None:
+        """按余额从高到低返回前 k 名的 qid，缓存不足以确定前 k 名时返回 None"""
+        if len(self._coins) < k and self.floor >= MIN_COINS:
+            return None
+        return [qid for qid, _ in heapq.nlargest(k, self._coins.items(), key=lambda item: item[1])]
+
+
+_top: TopCoins | None = None
+# 每次写入缓存都会递增，加载期间发生写入时丢弃加载结果
+_generation = 0
+
+
+async def load_top(session: AsyncSession) -> TopCoins:
+    global _top
+    generation = _generation
+    rows = (await session.exec(
+        select(User.qid, User.coins)
+        .where(User.qid != BANK_QID, User.coins >= MIN_COINS)
+        .order_by(User.coins.desc())
+        .limit(CANDIDATES)
+    )).all()
+    top = TopCoins(rows)
+    if generation == _generation:
+        _top = top
+    return top
+
+
+async def get_top(session: AsyncSession, k: int = TOP_K) -> list[str]:
+    """余额最高的 k 位用户（不含银行，余额不少于 MIN_COINS），与 ORDER BY coins DESC LIMIT k 一致"""
+    qids = _top.top(k) if _top is not None else None
+    if qids is None:
+        qids = (await load_top(session)).top(k)
+    return qids
+
+
+def stage(session: AsyncSession, balances: dict[str, int]):
+    """记录本事务中变动后的余额，提交后写入缓存，回滚则丢弃"""
+    session.info.setdefault(_STAGED, {}).update(balances)
+
+
+def mark_stale(session: AsyncSession):
+    """批量修改余额后调用，提交后缓存失效"""
+    session.info[_STALE] = True
+
+
+def invalidate():
+    global _top, _generation
+    _generation += 1
+    _top = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged(session: Session):
+    global _generation
+    if session.info.pop(_STALE, False):
+        session.info.pop(_STAGED, None)
+        invalidate()
+        return
+    balances = session.info.pop(_STAGED, None)
+    if balances:
+        _generation += 1
+        if _top is not None:
+            for qid, coins in balances.items():
+                _top.update(qid, coins)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_staged(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_STAGED, None)
+        session.info.pop(_STALE, None)
+
+
+@scheduler.scheduled_job("interval", seconds=REFRESH_INTERVAL, id="refresh_capitalists")
+async def refresh_capitalists():
+    async with new_session() as session:
+        await load_top(session)
@@ -36,3 +36,28 @@ class Server(BaseModel):
 
 class ServersInfo(BaseModel):
     servers: List[Server | None]
+
+
+class PlayerBrief(BaseModel):
+    """只保留展示用到的字段，跳过 ip、loss、rate 等字段的校验"""
+    name: str
+    steamid64: str
+
+
+class ServerBrief(BaseModel):
+    server_name: str
+    map: str
+    tier: int
+    player_count: int
+    max_players: int
+    players: List[PlayerBrief]
+
+
+class ServersBrief(BaseModel):
+    servers: List[ServerBrief | None]
+
+
+def parse_servers_info(data: list, lean: bool = True) -> ServersInfo | ServersBrief:
+    """解析 /servers/ 响应，lean=True 时使用精简模型"""
+    model = ServersBrief if lean else ServersInfo
+    return model.model_validate({'servers': data})
@@ -1,14 +1,16 @@
-
-from sqlmodel import create_engine, SQLModel
+from sqlalchemy.ext.asyncio import create_async_engine
 import nonebot
 
 from ... import axekz_config
 
-engine = create_engine(axekz_config.get_connection_string())
+engine = create_async_engine(axekz_config.get_connection_string(), pool_pre_ping=True, pool_recycle=3600)
+
 
+async def dispose_engine():
+    await engine.dispose()
 
-async def create_tables():
-    SQLModel.metadata.create_all(engine)
 
+from .migrations import run_migrations  # noqa: E402
 
-nonebot.get_driver().on_startup(create_tables)
+nonebot.get_driver().on_startup(run_migrations)
+nonebot.get_driver().on_shutdown(dispose_engine)
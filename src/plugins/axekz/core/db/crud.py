@@ -1,10 +1,13 @@
 from dataclasses import dataclass
+from datetime import datetime
 
-from sqlmodel import select, Session, or_
+from sqlalchemy import and_, delete
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from . import engine
-from .deps import SessionDep
-from .models import LJPKRecord, User
+from .deps import new_session
+from .models import LJPKRecord, LJPKPlayerStats, User, KZGlobalRecord, KZGlobalSync
 from ... import axekz_config
 
 
@@ -17,71 +20,219 @@ class LJPKStats:
     total_matches: int
 
 
-def get_bot_user() -> User | None:
-    with Session(engine) as session:
-        return session.get(User, axekz_config.bot_qid)
+async def get_bot_user() -> User | None:
+    async with new_session() as session:
+        return await session.get(User, str(axekz_config.bot_qid))
 
 
-def get_user_lee() -> User | None:
-    with Session(engine) as session:
-        return session.get(User, 2678754694)
+async def get_user_lee() -> User | None:
+    async with new_session() as session:
+        return await session.get(User, '2678754694')
 
 
-async def get_ljpk_stats(user_id: str | int) -> LJPKStats:
-    with Session(engine) as session:
-        # Query to get the user's nickname
-        user = session.exec(select(User).where(User.qid == user_id)).one_or_none()
-        if not user:
-            raise ValueError(f"User with ID {user_id} not found")
+async def get_ljpk_stats(user_id: str | int, mode: str | None = None) -> LJPKStats:
+    user_id = str(user_id)
+    join_on = LJPKPlayerStats.qid == User.qid
+    if mode is not None:
+        join_on = and_(join_on, LJPKPlayerStats.mode == mode)
 
-        # Query to get all matches involving the user
-        statement = select(LJPKRecord).where(
-            or_(LJPKRecord.qid1 == user_id, LJPKRecord.qid2 == user_id)
+    # 直接读取按 (qid, mode) 主键维护的累计表，各模式求和
+    statement = (
+        select(
+            User.nickname,
+            func.sum(LJPKPlayerStats.matches),
+            func.sum(LJPKPlayerStats.wins),
+            func.sum(LJPKPlayerStats.net_coins),
+            func.sum(LJPKPlayerStats.distance_sum),
         )
-        results = session.exec(statement).all()
+        .select_from(User)
+        .outerjoin(LJPKPlayerStats, join_on)
+        .where(User.qid == user_id)
+        .group_by(User.qid, User.nickname)
+    )
 
-        if not results:
-            return LJPKStats(
-                nickname=user.nickname,
-                winrate=0.00,
-                net_coins=0,
-                avg_distance=0.0000,
-                total_matches=0
-            )
+    async with new_session() as session:
+        row = (await session.exec(statement)).one_or_none()
 
-        total_matches = len(results)
-        wins = sum(1 for record in results if record.winner_qid == user_id)
-        winrate = wins / total_matches * 100
-
-        total_win_coins = sum(record.bet_amount for record in results if record.winner_qid == user_id)
-        total_lose_coins = sum(record.bet_amount for record in results if record.winner_qid != user_id)
-
-        net_coins = total_win_coins - total_lose_coins
-
-        total_distance = sum(record.distance1 if record.qid1 == user_id else record.distance2 for record in results)
-        avg_distance = total_distance / total_matches
+    if row is None:
+        raise ValueError(f"User with ID {user_id} not found")
 
+    nickname, total_matches, wins, net_coins, total_distance = row
+    if not total_matches:
         return LJPKStats(
-            nickname=user.nickname,
-            winrate=round(winrate, 2),
-            net_coins=net_coins,
-            avg_distance=round(avg_distance, 4),
-            total_matches=total_matches
+            nickname=nickname,
+            winrate=0.00,
+            net_coins=0,
+            avg_distance=0.0000,
+            total_matches=0
         )
 
+    return _to_ljpk_stats(nickname, int(total_matches), int(wins), int(net_coins), float(total_distance))
 
-async def get_top_ljpk_players() -> list[LJPKStats]:
-    with Session(engine) as session:
-        # Query all unique winner_qid
-        statement = select(LJPKRecord.winner_qid).distinct()
-        winner_qids = session.exec(statement).all()
 
-        # For each unique winner_qid, calculate their stats
-        player_stats = []
-        for winner_qid in winner_qids:
-            stats = await get_ljpk_stats(winner_qid)
-            player_stats.append(stats)
-
-        # Sort players by net_coins in descending order
-        player_stats.sort(key=lambda x: x.net_coins, reverse=True)
-        return player_stats
+async def get_top_ljpk_players(limit: int | None = 10, reverse: bool = False, mode: str = 'kzt') -> list[LJPKStats]:
+    """按净胜硬币排名该模式下的 LJPK 玩家，reverse 为 True 时从低到高"""
+    statement = (
+        select(
+            User.nickname,
+            LJPKPlayerStats.matches,
+            LJPKPlayerStats.wins,
+            LJPKPlayerStats.net_coins,
+            LJPKPlayerStats.distance_sum,
+        )
+        .join(User, User.qid == LJPKPlayerStats.qid)
+        .where(LJPKPlayerStats.mode == mode, LJPKPlayerStats.matches > 0)
+        .order_by(LJPKPlayerStats.net_coins.asc() if reverse else LJPKPlayerStats.net_coins.desc())
+        .limit(limit)
+    )
+
+    async with new_session() as session:
+        rows = (await session.exec(statement)).all()
+
+    return [_to_ljpk_stats(*row) for row in rows]
+
+
+def _to_ljpk_stats(nickname: str, total_matches: int, wins: int, net_coins: int, total_distance: float) -> LJPKStats:
+    return LJPKStats(
+        nickname=nickname,
+        winrate=round(wins / total_matches * 100, 2),
+        net_coins=net_coins,
+        avg_distance=round(total_distance / total_matches, 4),
+        total_matches=total_matches
+    )
+
+
+def _ljpk_stats_upsert(qid: str, mode: str, won: bool, bet_amount: int, distance: float):
+    stmt = mysql_insert(LJPKPlayerStats).values(
+        qid=qid,
+        mode=mode,
+        matches=1,
+        wins=int(won),
+        coins_won=bet_amount if won else 0,
+        coins_lost=0 if won else bet_amount,
+        net_coins=bet_amount if won else -bet_amount,
+        distance_sum=distance,
+        best_distance=distance,
+    )
+    return stmt.on_duplicate_key_update(
+        matches=LJPKPlayerStats.matches + stmt.inserted.matches,
+        wins=LJPKPlayerStats.wins + stmt.inserted.wins,
+        coins_won=LJPKPlayerStats.coins_won + stmt.inserted.coins_won,
+        coins_lost=LJPKPlayerStats.coins_lost + stmt.inserted.coins_lost,
+        net_coins=LJPKPlayerStats.net_coins + stmt.inserted.net_coins,
+        distance_sum=LJPKPlayerStats.distance_sum + stmt.inserted.distance_sum,
+        best_distance=func.greatest(LJPKPlayerStats.best_distance, stmt.inserted.best_distance),
+        updated_at=func.now(),
+    )
+
+
+async def record_ljpk_match(session: AsyncSession, record: LJPKRecord):
+    """写入对局记录并累加双方统计，由调用方在同一事务中提交"""
+    session.add(record)
+    for qid, distance in ((record.qid1, record.distance1), (record.qid2, record.distance2)):
+        await session.exec(_ljpk_stats_upsert(
+            qid, record.mode, record.winner_qid == qid, record.bet_amount, distance
+        ))
+
+
+async def rebuild_ljpk_player_stats(chunk_size: int = 5000) -> int:
+    """从 qq_ljpk 历史分块重建 ljpk_player_stats，返回处理的对局数"""
+    totals: dict[tuple[str, str], LJPKPlayerStats] = {}
+
+    def fold(records):
+        for r in records:
+            for qid, distance in ((r.qid1, r.distance1), (r.qid2, r.distance2)):
+                stats = totals.get((qid, r.mode))
+                if stats is None:
+                    stats = totals[(qid, r.mode)] = LJPKPlayerStats(qid=qid, mode=r.mode, best_distance=distance)
+                won = r.winner_qid == qid
+                stats.matches += 1
+                stats.wins += int(won)
+                if won:
+                    stats.coins_won += r.bet_amount
+                else:
+                    stats.coins_lost += r.bet_amount
+                stats.net_coins = stats.coins_won - stats.coins_lost
+                stats.distance_sum += distance
+                stats.best_distance = max(stats.best_distance, distance)
+
+    last_id, processed = 0, 0
+    async with new_session() as session:
+        while True:
+            chunk = (await session.exec(
+                select(LJPKRecord).where(LJPKRecord.id > last_id).order_by(LJPKRecord.id).limit(chunk_size)
+            )).all()
+            if not chunk:
+                break
+            fold(chunk)
+            last_id, processed = chunk[-1].id, processed + len(chunk)
+            session.expunge_all()
+
+    async with new_session() as session:
+        # 锁住尾部区间，阻止重建期间插入新对局，再补上流式读取之后新增的记录
+        tail = (await session.exec(
+            select(LJPKRecord).where(LJPKRecord.id > last_id).order_by(LJPKRecord.id).with_for_update()
+        )).all()
+        fold(tail)
+        processed += len(tail)
+
+        await session.exec(delete(LJPKPlayerStats))
+        session.add_all(totals.values())
+        await session.commit()
+
+    return processed
+
+
+async def upsert_kz_records(session: AsyncSession, rows: list[dict]):
+    """写入 GlobalAPI 成绩镜像，同一地图的新成绩覆盖旧成绩；rows 需按 updated_on 升序"""
+    if not rows:
+        return
+    stmt = mysql_insert(KZGlobalRecord).values(rows)
+    await session.exec(stmt.on_duplicate_key_update(
+        record_id=stmt.inserted.record_id,
+        player_name=stmt.inserted.player_name,
+        server_id=stmt.inserted.server_id,
+        teleports=stmt.inserted.teleports,
+        time=stmt.inserted.time,
+        points=stmt.inserted.points,
+        updated_on=stmt.inserted.updated_on,
+    ))
+
+
+async def mark_kz_synced(session: AsyncSession, steamid64: str, mode: str, synced_at: datetime):
+    stmt = mysql_insert(KZGlobalSync).values(steamid64=steamid64, mode=mode, synced_at=synced_at)
+    await session.exec(stmt.on_duplicate_key_update(synced_at=stmt.inserted.synced_at))
+
+
+async def get_kz_records_watermark(session: AsyncSession, steamid64: str, mode: str) -> datetime | None:
+    return (await session.exec(
+        select(func.max(KZGlobalRecord.updated_on))
+        .where(KZGlobalRecord.steamid64 == steamid64, KZGlobalRecord.mode == mode)
+    )).one()
+
+
+async def get_kz_best_per_map(
+        session: AsyncSession, steamid64: str, mode: str, has_teleports: bool | None = None
+) -> list[KZGlobalRecord]:
+    statement = select(KZGlobalRecord).where(KZGlobalRecord.steamid64 == steamid64, KZGlobalRecord.mode == mode)
+    if has_teleports is not None:
+        statement = statement.where(KZGlobalRecord.has_teleports == has_teleports)
+    return list((await session.exec(statement.order_by(KZGlobalRecord.map_name))).all())
+
+
+async def get_kz_recent_records(session: AsyncSession, steamid64: str, mode: str, limit: int = 10) -> list[KZGlobalRecord]:
+    return list((await session.exec(
+        select(KZGlobalRecord)
+        .where(KZGlobalRecord.steamid64 == steamid64, KZGlobalRecord.mode == mode)
+        .order_by(KZGlobalRecord.updated_on.desc())
+        .limit(limit)
+    )).all())
+
+
+async def count_kz_records_by_server(session: AsyncSession, steamid64: str, mode: str) -> dict[int, int]:
+    rows = (await session.exec(
+        select(KZGlobalRecord.server_id, func.count())
+        .where(KZGlobalRecord.steamid64 == steamid64, KZGlobalRecord.mode == mode)
+        .group_by(KZGlobalRecord.server_id)
+    )).all()
+    return dict(rows)
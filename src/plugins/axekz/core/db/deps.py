@@ -1,14 +1,19 @@
-from typing import Generator, Annotated
+from typing import AsyncGenerator, Annotated
 
 from nonebot.internal.params import Depends
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ..db import engine
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+def new_session() -> AsyncSession:
+    # 提交后不过期对象，避免在协程外触发隐式的懒加载查询
+    return AsyncSession(engine, expire_on_commit=False)
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with new_session() as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_db)]
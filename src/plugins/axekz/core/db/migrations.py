@@ -0,0 +1,172 @@
+"""启动时执行的轻量级版本化迁移
+
+schema_migrations 记录已应用的最高版本；当数据库已是最新版本时直接跳过，
+不再对所有表做 create_all 的反射检查。新增表或索引时在 MIGRATIONS 末尾追加一个版本。
+"""
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from nonebot import logger
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import SQLModel, select, func
+
+from . import engine
+from .crud import rebuild_ljpk_player_stats
+from .models import SchemaMigration
+
+BANK_SHARDS = 16
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    table: str
+    name: str
+    columns: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class ExplainCheck:
+    """EXPLAIN 该语句时期望优化器选用的索引"""
+    sql: str
+    index: str
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    indexes: tuple[IndexSpec, ...] = ()
+    statements: tuple[str, ...] = ()
+    # 在记录版本之前执行的数据回填，使用各自的会话；失败时下次启动会重试
+    tasks: tuple[Callable[[], Awaitable], ...] = ()
+    checks: tuple[ExplainCheck, ...] = ()
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        description="hot path indexes",
+        indexes=(
+            IndexSpec('coin_transactions', 'ix_coin_transactions_user_id_created_at', ('user_id', 'created_at')),
+            IndexSpec('qq_signs', 'ix_qq_signs_qid_signed_at', ('qid', 'signed_at')),
+            IndexSpec('qq_ljpk', 'ix_qq_ljpk_qid1', ('qid1',)),
+            IndexSpec('qq_ljpk', 'ix_qq_ljpk_qid2', ('qid2',)),
+            IndexSpec('qq_ljpk', 'ix_qq_ljpk_winner_qid', ('winner_qid',)),
+            IndexSpec('bet_records', 'ix_bet_records_event_id_option_id', ('event_id', 'option_id')),
+            IndexSpec('qq_users', 'ix_qq_users_coins', ('coins',)),
+        ),
+        checks=(
+            ExplainCheck(
+                "SELECT * FROM coin_transactions WHERE user_id = '0' ORDER BY created_at DESC LIMIT 5",
+                'ix_coin_transactions_user_id_created_at',
+            ),
+            ExplainCheck(
+                "SELECT id FROM qq_signs WHERE qid = '0' AND signed_at >= CURDATE() AND signed_at < CURDATE() + INTERVAL 1 DAY",
+                'ix_qq_signs_qid_signed_at',
+            ),
+            ExplainCheck("SELECT id FROM qq_ljpk WHERE qid1 = '0'", 'ix_qq_ljpk_qid1'),
+            ExplainCheck("SELECT id FROM qq_ljpk WHERE qid2 = '0'", 'ix_qq_ljpk_qid2'),
+            ExplainCheck("SELECT id FROM qq_ljpk WHERE winner_qid = '0'", 'ix_qq_ljpk_winner_qid'),
+            ExplainCheck(
+                "SELECT SUM(bet_amount) FROM bet_records WHERE event_id = 0 AND option_id = 0",
+                'ix_bet_records_event_id_option_id',
+            ),
+            ExplainCheck(
+                "SELECT qid FROM qq_users WHERE coins >= 100 ORDER BY coins DESC LIMIT 3",
+                'ix_qq_users_coins',
+            ),
+        ),
+    ),
+    Migration(
+        version=2,
+        description="bank accumulator shards",
+        statements=(
+            "INSERT IGNORE INTO bank_shards (shard, pending) VALUES "
+            + ", ".join(f"({i}, 0)" for i in range(BANK_SHARDS)),
+        ),
+    ),
+    Migration(
+        version=3,
+        description="kz global records mirror",
+    ),
+    Migration(
+        version=4,
+        description="backfill ljpk_player_stats",
+        tasks=(rebuild_ljpk_player_stats,),
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def _current_version(conn: AsyncConnection) -> int:
+    try:
+        result = await conn.execute(select(func.max(SchemaMigration.version)))
+    except ProgrammingError:
+        # schema_migrations 尚不存在
+        await conn.rollback()
+        return 0
+    return result.scalar() or 0
+
+
+async def _index_exists(conn: AsyncConnection, index: IndexSpec) -> bool:
+    result = await conn.execute(
+        text(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :name LIMIT 1"
+        ),
+        {'table': index.table, 'name': index.name},
+    )
+    return result.first() is not None
+
+
+async def _apply(conn: AsyncConnection, migration: Migration):
+    for index in migration.indexes:
+        if await _index_exists(conn, index):
+            continue
+        columns = ', '.join(f'`{c}`' for c in index.columns)
+        await conn.execute(text(f"CREATE INDEX `{index.name}` ON `{index.table}` ({columns})"))
+        logger.info(f"[Migration] 创建索引 {index.table}.{index.name}")
+
+    for statement in migration.statements:
+        await conn.execute(text(statement))
+
+    for task in migration.tasks:
+        await task()
+
+    await conn.execute(
+        SchemaMigration.__table__.insert().values(version=migration.version, description=migration.description)
+    )
+    await conn.commit()
+
+
+async def explain_checks(conn: AsyncConnection, migration: Migration) -> bool:
+    """用 EXPLAIN 确认目标查询确实走了新索引，未命中时记录警告"""
+    ok = True
+    for check in migration.checks:
+        rows = (await conn.execute(text(f"EXPLAIN {check.sql}"))).mappings().all()
+        keys = {row.get('key') for row in rows}
+        if check.index not in keys:
+            ok = False
+            logger.warning(f"[Migration] 查询未使用索引 {check.index}（实际: {keys}）: {check.sql}")
+    return ok
+
+
+async def run_migrations():
+    async with engine.connect() as conn:
+        current = await _current_version(conn)
+        if current >= LATEST_VERSION:
+            logger.info(f"[Migration] 数据库结构已是最新版本 v{current}")
+            return
+
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.commit()
+
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+            await _apply(conn, migration)
+            logger.info(f"[Migration] 已应用 v{migration.version}: {migration.description}")
+            await explain_checks(conn, migration)
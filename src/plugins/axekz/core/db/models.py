@@ -1,7 +1,7 @@
 from datetime import datetime, date
 from textwrap import dedent
 
-from sqlalchemy import ForeignKeyConstraint, PrimaryKeyConstraint
+from sqlalchemy import ForeignKeyConstraint, PrimaryKeyConstraint, Index
 from sqlmodel import Field, SQLModel, Column, DateTime, func, Text, Enum, UniqueConstraint, Date
 
 
@@ -38,6 +38,10 @@ class CoinTransaction(SQLModel, table=True):
         "arbitrary_types_allowed": True
     }
 
+    __table_args__ = (
+        Index('ix_coin_transactions_user_id_created_at', 'user_id', 'created_at'),
+    )
+
 
 class User(SQLModel, table=True):
     __tablename__ = "qq_users"
@@ -45,7 +49,7 @@ class User(SQLModel, table=True):
     steamid: str = Field(unique=True, index=True)
     nickname: str = Field(default='')
     mode: str = Field(default='kzt', nullable=False)
-    coins: int = Field(default=0, nullable=False)
+    coins: int = Field(default=0, nullable=False, index=True)
     is_whitelist: bool = Field(default=False, nullable=False)
     created_at: datetime = Field(default_factory=datetime.now,
                                  sa_column=Column(DateTime, default=func.now(), nullable=False))
@@ -74,6 +78,10 @@ class Sign(SQLModel, table=True):
     signed_at: datetime = Field(default_factory=datetime.now,
                                 sa_column=Column(DateTime, default=func.now(), nullable=False))
 
+    __table_args__ = (
+        Index('ix_qq_signs_qid_signed_at', 'qid', 'signed_at'),
+    )
+
 
 class Roll(SQLModel, table=True):
     __tablename__ = "qq_rolls"
@@ -90,13 +98,13 @@ class LJPKRecord(SQLModel, table=True):
     id: int | None = Field(primary_key=True, default=None)
     match_date: datetime = Field(default_factory=datetime.now,
                                  sa_column=Column(DateTime, default=func.now(), nullable=False))
-    qid1: str = Field(foreign_key="qq_users.qid", nullable=False)
-    qid2: str = Field(foreign_key="qq_users.qid", nullable=False)
+    qid1: str = Field(foreign_key="qq_users.qid", nullable=False, index=True)
+    qid2: str = Field(foreign_key="qq_users.qid", nullable=False, index=True)
     distance1: float = Field(nullable=False)
     distance2: float = Field(nullable=False)
     bet_amount: int = Field(nullable=False)
     mode: str = Field(nullable=False)
-    winner_qid: str = Field(foreign_key="qq_users.qid", nullable=False)
+    winner_qid: str = Field(foreign_key="qq_users.qid", nullable=False, index=True)
 
     def __str__(self):
         return dedent(f"""
@@ -110,6 +118,26 @@ class LJPKRecord(SQLModel, table=True):
                       ).strip()
 
 
+class LJPKPlayerStats(SQLModel, table=True):
+    """每位玩家每个模式的 LJPK 累计数据，随对局写入同步维护"""
+    __tablename__ = "ljpk_player_stats"
+    qid: str = Field(foreign_key="qq_users.qid", primary_key=True)
+    mode: str = Field(primary_key=True)
+    matches: int = Field(default=0, nullable=False)
+    wins: int = Field(default=0, nullable=False)
+    coins_won: int = Field(default=0, nullable=False)
+    coins_lost: int = Field(default=0, nullable=False)
+    net_coins: int = Field(default=0, nullable=False)
+    distance_sum: float = Field(default=0, nullable=False)
+    best_distance: float = Field(default=0, nullable=False)
+    updated_at: datetime = Field(default_factory=datetime.now,
+                                 sa_column=Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False))
+
+    __table_args__ = (
+        Index('ix_ljpk_player_stats_mode_net_coins', 'mode', 'net_coins'),
+    )
+
+
 class Allowance(SQLModel, table=True):
     __tablename__ = "qq_allowances"
     id: int = Field(default=None, primary_key=True)
@@ -184,6 +212,7 @@ class BetRecord(SQLModel, table=True):
             ['option_id', 'event_id'],
             ['bet_options.option_id', 'bet_options.event_id']
         ),
+        Index('ix_bet_records_event_id_option_id', 'event_id', 'option_id'),
     )
 
 
@@ -230,3 +259,45 @@ class Transaction(SQLModel, table=True):
     type: str = Field(nullable=False)
     amount: int = Field(nullable=False)
 
+
+class BankShard(SQLModel, table=True):
+    """中央银行待入账收入，按分片累加以分散行锁，定期并入银行余额"""
+    __tablename__ = "bank_shards"
+    shard: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    pending: int = Field(default=0, nullable=False)
+
+
+class KZGlobalRecord(SQLModel, table=True):
+    """GlobalAPI 玩家成绩的本地镜像，每位玩家每张地图每种计时方式只保留最佳成绩"""
+    __tablename__ = "kz_global_records"
+    steamid64: str = Field(primary_key=True, max_length=20)
+    mode: str = Field(primary_key=True, max_length=16)
+    map_name: str = Field(primary_key=True, max_length=64)
+    has_teleports: bool = Field(primary_key=True)
+    record_id: int = Field(nullable=False)
+    player_name: str = Field(default='', nullable=False)
+    server_id: int = Field(nullable=False)
+    teleports: int = Field(default=0, nullable=False)
+    time: float = Field(nullable=False)
+    points: int = Field(default=0, nullable=False)
+    updated_on: datetime = Field(sa_column=Column(DateTime, nullable=False))
+
+    __table_args__ = (
+        Index('ix_kz_global_records_steamid64_mode_updated_on', 'steamid64', 'mode', 'updated_on'),
+    )
+
+
+class KZGlobalSync(SQLModel, table=True):
+    """每位玩家每个模式最近一次与 GlobalAPI 同步的时间"""
+    __tablename__ = "kz_global_sync"
+    steamid64: str = Field(primary_key=True, max_length=20)
+    mode: str = Field(primary_key=True, max_length=16)
+    synced_at: datetime = Field(sa_column=Column(DateTime, nullable=False))
+
+
+class SchemaMigration(SQLModel, table=True):
+    __tablename__ = "schema_migrations"
+    version: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    description: str = Field(default='', nullable=False)
+    applied_at: datetime = Field(default_factory=datetime.now,
+                                 sa_column=Column(DateTime, default=func.now(), nullable=False))
@@ -0,0 +1,156 @@
+"""硬币账本
+
+所有硬币流动都通过 transfer 完成：余额用带条件的 UPDATE 原子增减，
+账单记录一次性批量写入，全部落在调用方的同一个事务里，由调用方提交。
+
+中央银行的收入先累加到随机的 bank_shards 分片，由 fold_bank 定期并入银行余额，
+避免所有税收争抢银行这一行的行锁。
+"""
+import random
+from dataclasses import dataclass
+
+import nonebot
+from nonebot import logger
+from nonebot_plugin_apscheduler import scheduler
+from sqlmodel import select, update, insert, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import BANK_QID, capitalists
+from .db.deps import new_session
+from .db.migrations import BANK_SHARDS
+from .db.models import User, CoinTransaction, TransactionType, BankShard
+
+# 账单中央银行一方的 user_id
+BANK_LEDGER_ID = "bank"
+
+
+class InsufficientCoins(ValueError):
+    def __init__(self, qid: str, amount: int):
+        super().__init__(f"用户 {qid} 余额不足 {amount}")
+        self.qid = qid
+        self.amount = amount
+
+
+@dataclass
+class TransferResult:
+    from_balance: int | None = None
+    to_balance: int | None = None
+
+
+async def transfer(
+        session: AsyncSession,
+        from_qid: str | None,
+        to_qid: str | None,
+        amount: int,
+        *,
+        type: TransactionType,
+        description: str,
+        tax: int = 0,
+        to_description: str | None = None,
+        tax_description: str | None = None,
+) -> TransferResult:
+    """
+    从 from_qid 扣除 amount，to_qid 收到 amount - tax，tax 进入中央银行。
+
+    from_qid 为 None 表示系统发放，to_qid 为 None 表示硬币离开流通（如下注），
+    to_qid 为 BANK_QID 时全部金额进入中央银行。
+    余额不足时抛出 InsufficientCoins，调用方应放弃整个事务。
+    """
+    to_bank = to_qid == BANK_QID
+    net = amount - tax
+    bank_credit = tax + (net if to_bank else 0)
+
+    debits = {from_qid: amount} if from_qid else {}
+    credits = {to_qid: net} if to_qid and not to_bank else {}
+
+    # 固定按 qid 顺序加锁，避免互相转账时死锁
+    for qid in sorted(debits.keys() | credits.keys()):
+        delta = credits.get(qid, 0) - debits.get(qid, 0)
+        statement = update(User).where(User.qid == qid).values(coins=User.coins + delta)
+        if qid in debits:
+            statement = statement.where(User.coins >= debits[qid])
+        result = await session.exec(statement.execution_options(synchronize_session=False))
+        if result.rowcount != 1:
+            if qid in debits:
+                raise InsufficientCoins(qid, debits[qid])
+            raise ValueError(f"用户 {qid} 不存在")
+
+    if bank_credit:
+        await credit_bank(session, bank_credit)
+
+    records = []
+    if from_qid:
+        records.append(dict(user_id=from_qid, amount=-amount, type=type, description=description))
+    if to_qid and not to_bank:
+        records.append(dict(user_id=to_qid, amount=net, type=type, description=to_description or description))
+    if bank_credit:
+        records.append(dict(user_id=BANK_LEDGER_ID, amount=bank_credit, type=type,
+                            description=tax_description or to_description or description))
+    if records:
+        await session.exec(insert(CoinTransaction).values(records))
+
+    parties = [qid for qid in (from_qid, to_qid) if qid and qid != BANK_QID]
+    balances = dict((await session.exec(select(User.qid, User.coins).where(User.qid.in_(parties)))).all())
+    capitalists.stage(session, balances)
+    return TransferResult(
+        from_balance=balances.get(from_qid),
+        to_balance=balances.get(to_qid),
+    )
+
+
+async def credit_bank(session: AsyncSession, amount: int):
+    """把银行收入记入一个随机分片，不触碰银行用户行；分片不存在时抛出 RuntimeError，调用方应放弃整个事务"""
+    shard = random.randrange(BANK_SHARDS)
+    result = await session.exec(
+        update(BankShard)
+        .where(BankShard.shard == shard)
+        .values(pending=BankShard.pending + amount)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise RuntimeError(f"银行分片 {shard} 不存在")
+
+
+async def fold_bank() -> int:
+    """把所有分片的待入账金额并入银行余额，返回本次并入的金额"""
+    async with new_session() as session:
+        shards = (await session.exec(
+            select(BankShard).where(BankShard.pending != 0).with_for_update()
+        )).all()
+        total = sum(shard.pending for shard in shards)
+        if not total:
+            return 0
+
+        await session.exec(
+            update(User).where(User.qid == BANK_QID).values(coins=User.coins + total)
+            .execution_options(synchronize_session=False)
+        )
+        await session.exec(
+            update(BankShard).where(BankShard.shard.in_([shard.shard for shard in shards])).values(pending=0)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    logger.info(f"[Bank] 已并入 {total} 硬币")
+    return total
+
+
+async def get_bank_pending(session: AsyncSession) -> int:
+    """分片中尚未并入银行余额的金额，统计银行余额或硬币总量时需要加上"""
+    return int((await session.exec(select(func.coalesce(func.sum(BankShard.pending), 0)))).one())
+
+
+async def get_bank_balance(session: AsyncSession) -> int:
+    """银行余额 = 已并入的余额 + 分片中待入账的金额"""
+    pending = select(func.coalesce(func.sum(BankShard.pending), 0)).scalar_subquery()
+    balance = (await session.exec(select(User.coins + pending).where(User.qid == BANK_QID))).first()
+    if balance is None:
+        raise RuntimeError("中央银行用户不存在")
+    return int(balance)
+
+
+@scheduler.scheduled_job("interval", minutes=5, id="fold_bank")
+async def run_fold_bank():
+    await fold_bank()
+
+
+nonebot.get_driver().on_shutdown(fold_bank)
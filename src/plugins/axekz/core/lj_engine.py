@@ -0,0 +1,72 @@
+"""本地 LJ 模拟引擎
+
+按模式用历史 jumpstats 拟合 (distance, pre, max_val, strafes, sync) 的多元正态分布，
+距离的均值和方差改用 LJPK 历史对局数据，再用 NumPy 批量采样。
+"""
+from typing import Iterable, Sequence
+
+import numpy as np
+
+FIELDS = ('distance', 'pre', 'max_val', 'strafes', 'sync')
+
+# /gokz/jumpstats 字段 -> 样本字段
+JUMPSTATS_FIELDS = {
+    'Distance': 'distance',
+    'Pre': 'pre',
+    'Max': 'max_val',
+    'Strafes': 'strafes',
+    'Sync': 'sync',
+}
+
+
+class LJEngine:
+    def __init__(self, seed: int | None = None):
+        self._rng = np.random.default_rng(seed)
+        # mode -> (均值, 协方差, 下界, 上界)
+        self._models: dict[str, tuple] = {}
+
+    def is_fitted(self, mode: str) -> bool:
+        return mode in self._models
+
+    def fit(self, mode: str, jumpstats: Sequence[dict], distances: Iterable[float] = ()):
+        """
+        jumpstats 为 /gokz/jumpstats 返回的记录，distances 为 LJPK 历史距离。
+        距离样本不少于 2 条时，用其均值和标准差替换 jumpstats 中距离的边缘分布，保留与其它字段的相关性。
+        """
+        x = np.array([[float(row[key]) for key in JUMPSTATS_FIELDS] for row in jumpstats], dtype=float)
+        if len(x) < len(FIELDS) + 1:
+            raise ValueError(f"{mode} 的 jumpstats 样本不足（{len(x)} 条）")
+
+        mean = x.mean(axis=0)
+        cov = np.cov(x, rowvar=False)
+        low, high = x.min(axis=0), x.max(axis=0)
+
+        d = np.fromiter(distances, dtype=float)
+        if len(d) >= 2 and cov[0, 0] > 0:
+            scale = d.std(ddof=1) / np.sqrt(cov[0, 0])
+            mean[0] = d.mean()
+            cov[0, :] *= scale
+            cov[:, 0] *= scale
+            low[0], high[0] = min(low[0], d.min()), max(high[0], d.max())
+
+        self._models[mode] = (mean, cov, low, high)
+
+    def sample_array(self, mode: str, n: int):
+        """返回 n x len(FIELDS) 的样本矩阵，超出历史范围的值截断到边界"""
+        mean, cov, low, high = self._models[mode]
+        x = self._rng.multivariate_normal(mean, cov, size=n, method='eigh')
+        np.clip(x, low, high, out=x)
+        x[:, 3] = np.rint(x[:, 3])
+        return x
+
+    def sample(self, mode: str, n: int) -> list[dict]:
+        """与 /casual/lj 返回格式相同的样本，整批在 NumPy 中取整后再转为 dict"""
+        x = self.sample_array(mode, n)
+        columns = (
+            np.round(x[:, 0], 4).tolist(),
+            np.round(x[:, 1], 2).tolist(),
+            np.round(x[:, 2], 2).tolist(),
+            x[:, 3].astype(int).tolist(),
+            np.round(x[:, 4], 1).tolist(),
+        )
+        return [dict(zip(FIELDS, row)) for row in zip(*columns)]
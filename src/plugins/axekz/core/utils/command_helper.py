@@ -4,12 +4,11 @@ from dataclasses import dataclass, field, asdict
 from typing import Optional, Tuple
 
 from nonebot.adapters.onebot.v11 import MessageEvent
-from sqlmodel import Session
 from nonebot import logger
 
 from .formatters import format_kzmode
+from ..db.deps import new_session
 from ..db.models import User
-from ...core.db import engine
 from ...plugins import BIND_PROMPT
 
 
@@ -29,16 +28,27 @@ class CommandData:
     user: User | None = None
 
     def __init__(self, event, args):
-        args = parse_args(args.extract_plain_text())
+        self._event = event
+        self._parsed = parse_args(args.extract_plain_text())
         self.qid = event.get_user_id()
 
+    @classmethod
+    async def create(cls, event, args) -> "CommandData":
+        """解析参数并异步加载相关用户"""
+        cd = cls(event, args)
+        await cd._load()
+        return cd
+
+    async def _load(self):
+        event, args = self._event, self._parsed
+
         if 'error' in args:
             self.error = args['error']
             logger.info(f"Error during argument parsing: {self.error}")
             return
 
-        with Session(engine) as session:
-            user = session.get(User, self.qid)  # NOQA
+        async with new_session() as session:
+            user = await session.get(User, self.qid)  # NOQA
             if not user or not user.steamid:
                 self.error = BIND_PROMPT
                 logger.info(self.error)
@@ -51,7 +61,7 @@ class CommandData:
             # 提供了对手 QQ 号
             if qid2:
                 self.qid2 = qid2
-                user2 = session.get(User, self.qid2)
+                user2 = await session.get(User, self.qid2)
                 if not user2 or not user2.steamid:
                     self.error = "你指定的用户未绑定steamid"
                     logger.info(self.error)
@@ -1,13 +1,42 @@
-from datetime import datetime
-
+import asyncio
+from datetime import datetime, timedelta
+from itertools import chain
+
+from ..db.crud import (
+    upsert_kz_records, mark_kz_synced, get_kz_records_watermark, get_kz_best_per_map, get_kz_recent_records,
+    count_kz_records_by_server,
+)
+from ..db.deps import new_session
+from ..db.models import KZGlobalRecord, KZGlobalSync
+from .cache import TTLCache
 from .convertors import convert_steamid
 from .formatters import format_kzmode
-from .helpers import aio_get
+from .helpers import aio_get, aio_get_records
 
 GLOBAL_API_URL = "https://kztimerglobal.com/api/v2.0/"
 
+# 各接口的缓存时间（秒）
+WORLD_RECORD_TTL = 300
+PERSONAL_RECORDS_TTL = 60
+
+cache = TTLCache(maxsize=64)
+# 玩家全部记录（limit=10000）单条可达数十 MB，单独放在容量很小的缓存里
+records_cache = TTLCache(maxsize=4)
+
+
+async def cached_get(endpoint, params, ttl, update=False, store: TTLCache = cache):
+    """以 endpoint + 规范化后的参数为键缓存 GlobalAPI 响应，update=True 时跳过缓存强制刷新"""
+    key = (endpoint, tuple(sorted((k, str(v)) for k, v in params.items())))
+    if not update:
+        data = store.get(key)
+        if data is not None:
+            return data
+    data = await aio_get(f"{GLOBAL_API_URL}{endpoint}", params=params)
+    store.set(key, data, ttl)
+    return data
+
 
-async def fetch_global_stats(steamid64, mode_str, has_tp=True) -> list:
+async def fetch_global_stats(steamid64, mode_str, has_tp=True, update=False) -> list:
     steamid64 = convert_steamid(steamid64, 64)
     params = {
         'steamid64': steamid64,
@@ -17,26 +46,107 @@ async def fetch_global_stats(steamid64, mode_str, has_tp=True) -> list:
         'limit': 10000,
         'has_teleports': str(has_tp).lower(),
     }
-    data = await aio_get(f"{GLOBAL_API_URL}records/top", params=params)
+    data = await cached_get("records/top", params, PERSONAL_RECORDS_TTL, update, store=records_cache)
     return data
 
 
-async def fetch_personal_recent(steamid64, mode='kzt'):
-    steamid64 = convert_steamid(steamid64, 64)
+# 镜像需要的字段，流式解析时只保留这些
+MIRROR_FIELDS = ('id', 'steamid64', 'player_name', 'map_name', 'teleports', 'server_id', 'time', 'points', 'updated_on')
+
+
+def _to_mirror_row(record: tuple, mode: str) -> dict:
+    record_id, steamid64, player_name, map_name, teleports, server_id, time, points, updated_on = record
+    return {
+        'steamid64': str(steamid64),
+        'mode': mode,
+        'map_name': map_name,
+        'has_teleports': teleports > 0,
+        'record_id': record_id,
+        'player_name': player_name or '',
+        'server_id': server_id,
+        'teleports': teleports,
+        'time': time,
+        'points': points or 0,
+        'updated_on': datetime.fromisoformat(updated_on),
+    }
+
+
+async def _fetch_mirror_records(url, params=None) -> list[tuple]:
+    return await aio_get_records(url, MIRROR_FIELDS, params=params)
+
+
+async def sync_personal_records(steamid64, mode='kzt', update=False, fetch=None):
+    """
+    将玩家的 GlobalAPI 成绩同步到本地镜像 kz_global_records。
+
+    首次同步下载全部 TP/PRO 成绩，之后只拉取 created_since 不早于本地最新一条的成绩；
+    PERSONAL_RECORDS_TTL 内重复调用直接跳过，update=True 时强制同步。
+    fetch(url, params=...) 返回按 MIRROR_FIELDS 排列的元组列表，可替换为本地桩函数。
+    下载期间不持有数据库会话：先读同步状态，再请求 GlobalAPI，最后用新会话写入。
+    """
+    fetch = fetch or _fetch_mirror_records
+    steamid64 = str(convert_steamid(steamid64, 64))
     mode = format_kzmode(mode)
+    now = datetime.now()
 
-    data_with_tp = await fetch_global_stats(steamid64, mode, True)
-    data_without_tp = await fetch_global_stats(steamid64, mode, False)
-    data = data_with_tp + data_without_tp
+    async with new_session() as session:
+        state = await session.get(KZGlobalSync, (steamid64, mode))
+        if state and not update and now - state.synced_at < timedelta(seconds=PERSONAL_RECORDS_TTL):
+            return
+        watermark = await get_kz_records_watermark(session, steamid64, mode) if state else None
+
+    params = {
+        'steamid64': steamid64,
+        'tickrate': 128,
+        'stage': 0,
+        'modes_list_string': mode,
+        'limit': 10000,
+    }
+    if watermark:
+        params['created_since'] = watermark.isoformat()
+        data = await fetch(f"{GLOBAL_API_URL}records/top/recent", params=params)
+    else:
+        data_with_tp, data_without_tp = await asyncio.gather(
+            fetch(f"{GLOBAL_API_URL}records/top", params={**params, 'has_teleports': 'true'}),
+            fetch(f"{GLOBAL_API_URL}records/top", params={**params, 'has_teleports': 'false'}),
+        )
+        data = chain(data_with_tp, data_without_tp)
+    rows = sorted((_to_mirror_row(record, mode) for record in data), key=lambda r: r['updated_on'])
+
+    async with new_session() as session:
+        await upsert_kz_records(session, rows)
+        await mark_kz_synced(session, steamid64, mode, now)
+        await session.commit()
 
-    for item in data:
-        item["created_on_datetime"] = datetime.fromisoformat(item["updated_on"])
-    sorted_data = sorted(data, key=lambda x: x["created_on_datetime"], reverse=True)
 
-    return sorted_data[0]
+def _from_mirror_row(record: KZGlobalRecord) -> dict:
+    """镜像行转回 GlobalAPI 记录的字段名，只包含镜像保存的字段"""
+    return {
+        'id': record.record_id,
+        'steamid64': record.steamid64,
+        'player_name': record.player_name,
+        'map_name': record.map_name,
+        'mode': record.mode,
+        'server_id': record.server_id,
+        'teleports': record.teleports,
+        'time': record.time,
+        'points': record.points,
+        'updated_on': record.updated_on.isoformat(),
+        'created_on_datetime': record.updated_on,
+    }
+
+
+async def fetch_personal_recent(steamid64, mode='kzt', update=False, fetch=None) -> dict:
+    steamid64 = str(convert_steamid(steamid64, 64))
+    mode = format_kzmode(mode)
 
+    await sync_personal_records(steamid64, mode, update, fetch)
+    async with new_session() as session:
+        records = await get_kz_recent_records(session, steamid64, mode, limit=1)
+    return _from_mirror_row(records[0])
 
-async def fetch_personal_best(steamid64, map_name, mode='kzt', has_tp=True):
+
+async def fetch_personal_best(steamid64, map_name, mode='kzt', has_tp=True, update=False):
     steamid64 = convert_steamid(steamid64, 64)
     mode = format_kzmode(mode)
 
@@ -48,15 +158,14 @@ async def fetch_personal_best(steamid64, map_name, mode='kzt', has_tp=True):
         'has_teleports': str(has_tp).lower()
     }
 
-    url = "https://kztimerglobal.com/api/v2.0/records/top"
-    data = await aio_get(url, params=params)
+    data = await cached_get("records/top", params, PERSONAL_RECORDS_TTL, update)
     if data:
         return data[0]
     else:
         return None
 
 
-async def fetch_world_record(map_name, mode='kzt', has_tp=True):
+async def fetch_world_record(map_name, mode='kzt', has_tp=True, update=False):
     mode = format_kzmode(mode)
     params = {
         'map_name': map_name,
@@ -66,32 +175,31 @@ async def fetch_world_record(map_name, mode='kzt', has_tp=True):
         'place_top_at_least': 1
     }
 
-    data = await aio_get(f"{GLOBAL_API_URL}records/top/recent", params=params)
+    data = await cached_get("records/top/recent", params, WORLD_RECORD_TTL, update)
     return data[0]
 
 
-async def fetch_personal_purity(steamid64, mode='kzt', exclusive=False) -> dict:
+async def fetch_personal_purity(steamid64, mode='kzt', exclusive=False, update=False, fetch=None) -> dict:
     server_id = [1683, 1633, 1393]
 
-    steamid64 = convert_steamid(steamid64, 64)
+    steamid64 = str(convert_steamid(steamid64, 64))
     mode = format_kzmode(mode)
 
-    data_with_tp = await fetch_global_stats(steamid64, mode, True)
-    data_without_tp = await fetch_global_stats(steamid64, mode, False)
-    data = data_with_tp + data_without_tp
+    await sync_personal_records(steamid64, mode, update, fetch)
+    async with new_session() as session:
+        records = await get_kz_best_per_map(session, steamid64, mode)
+        server_counts = await count_kz_records_by_server(session, steamid64, mode)
 
-    maps = [f"{record['map_name']} {'TP' if record['teleports'] else 'PRO'}" for record in data if record['server_id'] != 1683]
-
-    if exclusive:
-        count = sum(1 for item in data if item.get('server_id') in server_id)
-    else:
-        count = sum(1 for item in data if item.get('server_id') == server_id[0])
+    counted = server_id if exclusive else server_id[:1]
+    count = sum(server_counts.get(s, 0) for s in counted)
+    total = sum(server_counts.values())
+    maps = [f"{record.map_name} {'TP' if record.teleports else 'PRO'}" for record in records if record.server_id != 1683]
 
     return {
-        'name': data[0]['player_name'],
+        'name': records[0].player_name,
         'steamid64': steamid64,
         'count': count,
-        'total': len(data),
-        'percentage': count / len(data),
+        'total': total,
+        'percentage': count / total,
         'maps': maps,
     }
@@ -1,34 +1,137 @@
+import asyncio
+import codecs
+import json
 import ssl
 
 import aiohttp
+import nonebot
 from aiohttp import ClientTimeout
+from yarl import URL
 
 context = ssl.create_default_context()
 
+API_BASE = 'http://127.0.0.1:8000'
 
-async def aio_get(url, params=None, headers=None, timeout=5):
-    conn = aiohttp.TCPConnector(ssl=context)
-    async with aiohttp.ClientSession(connector=conn, timeout=ClientTimeout(total=timeout)) as session:
-        async with session.get(url, params=params, headers=headers) as response:
-            return await response.json()
+# 每个上游一个长连接会话，复用 TCP/TLS 连接
+_sessions: dict[str, aiohttp.ClientSession] = {}
 
 
-async def api_get(router, params=None, headers=None, timeout=5):
-    url = 'http://127.0.0.1:8000' + router
-    conn = aiohttp.TCPConnector(ssl=context)
-    async with aiohttp.ClientSession(connector=conn, timeout=ClientTimeout(total=timeout)) as session:
-        async with session.get(url, params=params, headers=headers) as response:
-            return await response.json()
+def _get_session(url) -> aiohttp.ClientSession:
+    origin = str(URL(url).origin())
+    session = _sessions.get(origin)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(ssl=context, limit_per_host=20, ttl_dns_cache=300, keepalive_timeout=60)
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[origin] = session
+    return session
+
+
+# 进行中的相同 GET 请求共享同一个任务
+_inflight: dict[tuple, asyncio.Task] = {}
+singleflight_stats = {'requests': 0, 'coalesced': 0}
+
+
+def _request_key(url, params, headers) -> tuple:
+    return (
+        url,
+        tuple(sorted((k, str(v)) for k, v in (params or {}).items())),
+        tuple(sorted((headers or {}).items())),
+    )
+
+
+async def open_sessions():
+    _get_session(API_BASE)
+
+
+async def close_sessions():
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    for session in sessions:
+        await session.close()
+
+
+async def _get_json(url, params, headers, timeout):
+    session = _get_session(url)
+    async with session.get(url, params=params, headers=headers, timeout=ClientTimeout(total=timeout)) as response:
+        return await response.json()
+
+
+async def aio_get(url, params=None, headers=None, timeout=5, coalesce=True):
+    """
+    GET 并解析 JSON。coalesce=True 时，并发的相同请求只向上游发送一次并共享结果，
+    返回的对象可能被多个调用方共用，不要原地修改；结果带随机性的接口应传 coalesce=False。
+    """
+    if not coalesce:
+        return await _get_json(url, params, headers, timeout)
+
+    key = _request_key(url, params, headers)
+    task = _inflight.get(key)
+    if task is None:
+        singleflight_stats['requests'] += 1
+        task = asyncio.ensure_future(_get_json(url, params, headers, timeout))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key) if _inflight.get(key) is t else None)
+    else:
+        singleflight_stats['coalesced'] += 1
+    # shield: 某个调用方被取消时不影响共享的请求
+    return await asyncio.shield(task)
+
+
+async def aio_get_records(url, fields: tuple[str, ...], params=None, headers=None, timeout=30) -> list[tuple]:
+    """
+    流式解析返回 JSON 数组的接口，每条记录只保留 fields 中的字段并转为元组。
+
+    边读边解码，任一时刻只有一条记录以 dict 形式存在，适合 records/top 这类上万条的响应。
+    """
+    session = _get_session(url)
+    async with session.get(url, params=params, headers=headers, timeout=ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        records = []
+        buffer = ''
+        started = False
+
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            buffer += text_decoder.decode(chunk)
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos == len(buffer):
+                    break
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"期望 JSON 数组，实际响应以 {buffer[pos:pos + 50]!r} 开头")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return records
+                try:
+                    item, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # 记录被分块截断，等待下一块
+                    break
+                records.append(tuple(item.get(field) for field in fields))
+            buffer = buffer[pos:]
+
+        raise ValueError("JSON 数组不完整")
+
+
+async def api_get(router, params=None, headers=None, timeout=5, coalesce=True):
+    return await aio_get(API_BASE + router, params=params, headers=headers, timeout=timeout, coalesce=coalesce)
 
 
 async def aio_post(url, data=None, headers=None, timeout=60):
-    async with aiohttp.ClientSession(timeout=ClientTimeout(total=timeout)) as session:
-        async with session.post(url, json=data, headers=headers) as response:
-            return await response.json()
+    session = _get_session(url)
+    async with session.post(url, json=data, headers=headers, timeout=ClientTimeout(total=timeout)) as response:
+        return await response.json()
 
 
 async def api_post(router, data=None, headers=None, timeout=60):
-    url = 'http://127.0.0.1:8000' + router
-    async with aiohttp.ClientSession(timeout=ClientTimeout(total=timeout)) as session:
-        async with session.post(url, json=data, headers=headers) as response:
-            return await response.json()
+    return await aio_post(API_BASE + router, data=data, headers=headers, timeout=timeout)
+
+
+nonebot.get_driver().on_startup(open_sessions)
+nonebot.get_driver().on_shutdown(close_sessions)
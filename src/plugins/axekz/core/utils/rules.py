@@ -0,0 +1,17 @@
+from typing import Container
+
+from nonebot.adapters.onebot.v11 import GroupMessageEvent
+from nonebot.rule import Rule
+
+
+def reply_to_tracked(tracked: Container[tuple[int, int]]) -> Rule:
+    """
+    只放行回复了 tracked 中 (group_id, message_id) 消息的群消息。
+
+    Rule 在依赖注入之前检查，普通聊天消息不会创建数据库会话。
+    """
+
+    async def _reply_to_tracked(event: GroupMessageEvent) -> bool:
+        return event.reply is not None and (event.group_id, int(event.reply.message_id)) in tracked
+
+    return Rule(_reply_to_tracked)
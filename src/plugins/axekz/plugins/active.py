@@ -8,9 +8,10 @@ from nonebot.plugin import on_command
 from sqlmodel import select
 
 from .general import bind_steamid
-from ..core import get_bank, BANK_QID
-from ..core.db.deps import SessionDep
-from ..core.db.models import Sign, CoinTransaction, TransactionType
+from ..core import capitalists, ledger
+from ..core.db.deps import AsyncSessionDep
+from ..core.db.models import Sign, TransactionType
+from ..core.ledger import InsufficientCoins
 from ..core.db.models import User, Allowance
 from ..core.utils.command_helper import CommandData
 
@@ -23,14 +24,14 @@ bank = on_command("bank", aliases={"银行", "余额", "bank_balance"})
 
 
 @bank.handle()
-async def _(event: MessageEvent, session: SessionDep):
-    bank_user = get_bank()
-    await bank.finish(f"银行当前拥有 {bank_user.coins} 枚硬币")
+async def _(event: MessageEvent, session: AsyncSessionDep):
+    balance = await ledger.get_bank_balance(session)
+    await bank.finish(f"银行当前拥有 {balance} 枚硬币")
 
 
 @give.handle()
-async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+async def _(event: MessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
+    cd = await CommandData.create(event, args)
     if cd.error:
         return await give.send(cd.error, at_sender=True)
     if not cd.user2:
@@ -53,79 +54,60 @@ async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg
     if cd.user1.coins < amount:
         return await give.send(f"余额不足 你有: {cd.user1.coins} 需要 {amount}", at_sender=True)
 
-    cd.user1.coins -= amount
-    cd.user2.coins += amount_after_tax
-    bank = get_bank()
-    bank.coins += tax
-
-    session.add_all([cd.user1, cd.user2, bank])
-
-    # 添加交易记录
-    session.add_all([
-        CoinTransaction(
-            user_id=cd.user1.qid,
-            amount=-amount,
-            type=TransactionType.GIVE,
-            description=f"转账给 {cd.user2.nickname}（含税）"
-        ),
-        CoinTransaction(
-            user_id=cd.user2.qid,
-            amount=amount_after_tax,
+    try:
+        result = await ledger.transfer(
+            session, cd.user1.qid, cd.user2.qid, amount,
+            tax=tax,
             type=TransactionType.GIVE,
-            description=f"收到来自 {cd.user1.nickname} 的转账（税后）"
-        ),
-        CoinTransaction(
-            user_id="bank",
-            amount=tax,
-            type=TransactionType.GIVE,
-            description=f"转账税收来自 {cd.user1.nickname}"
+            description=f"转账给 {cd.user2.nickname}（含税）",
+            to_description=f"收到来自 {cd.user1.nickname} 的转账（税后）",
+            tax_description=f"转账税收来自 {cd.user1.nickname}",
         )
-    ])
-
-    session.commit()
-    session.refresh(cd.user1)
-    session.refresh(cd.user2)
+    except InsufficientCoins:
+        return await give.send(f"余额不足 需要 {amount}", at_sender=True)
+    await session.commit()
 
     return await give.send(
         f"赠送给 {cd.user2.nickname} {amount_after_tax} 硬币成功（原始 {amount}，税收 {tax}）\n"
-        f"对方余额 {cd.user2.coins}(+{amount_after_tax})\n"
-        f"你的余额 {cd.user1.coins}(-{amount})",
+        f"对方余额 {result.to_balance}(+{amount_after_tax})\n"
+        f"你的余额 {result.from_balance}(-{amount})",
         at_sender=True
     )
 
 
 @sign.handle()
-async def _(event: GroupMessageEvent, session: SessionDep):
+async def _(event: GroupMessageEvent, session: AsyncSessionDep):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
 
     today = datetime.now().date()
-    sign_in_today = session.exec(
+    sign_in_today = (await session.exec(
         select(Sign).where(
             Sign.qid == user_id,
             Sign.signed_at >= today,
             Sign.signed_at < today + timedelta(days=1)
         )
-    ).first()
+    )).first()
 
     if sign_in_today:
         return await sign.finish(f"今天已经签到过了，请明天再来！\n余额: {user.coins}")
 
-    # 获取硬币最多的用户（硬币 > 100）
-    top_users = session.exec(
-        select(User)
-        .where(User.qid != BANK_QID, User.coins >= 100)
-        .order_by(User.coins.desc())
-        .limit(3)
-    ).all()
-
-    if not top_users:
-        return await sign.finish("今天没有资本家可以签到吸血了")
-
-    weights = [3, 2, 1][:len(top_users)]
-    giver = random.choices(top_users, weights=weights, k=1)[0]
+    # 获取硬币最多的用户（硬币 >= 100）
+    for _ in range(2):
+        top_qids = await capitalists.get_top(session)
+        if not top_qids:
+            return await sign.finish("今天没有资本家可以签到吸血了")
+
+        weights = [3, 2, 1][:len(top_qids)]
+        giver = await session.get(User, random.choices(top_qids, weights=weights, k=1)[0])
+        if giver:
+            break
+        # 缓存中的用户已不存在，重新加载后再选一次
+        capitalists.invalidate()
+    else:
+        return await sign.finish("资本家名单正在更新，请稍后再试")
 
     # 正态分布获取硬币数（默认 20±5）
     earned_coins = round(random.gauss(20, 5))
@@ -136,37 +118,23 @@ async def _(event: GroupMessageEvent, session: SessionDep):
     #     earned_coins *= 2
 
     # 硬币转移
-    giver.coins -= earned_coins
-    user.coins += earned_coins
-
-    session.add_all([
-        CoinTransaction(
-            user_id=giver.qid,
-            amount=-earned_coins,
+    try:
+        result = await ledger.transfer(
+            session, giver.qid, user.qid, earned_coins,
             type=TransactionType.SIGN,
-            description=f"签到被 {user.nickname} 薅走"
-        ),
-        CoinTransaction(
-            user_id=user.qid,
-            amount=earned_coins,
-            type=TransactionType.SIGN,
-            description=f"签到从 {giver.nickname} 薅得"
+            description=f"签到被 {user.nickname} 薅走",
+            to_description=f"签到从 {giver.nickname} 薅得",
         )
-    ])
+    except InsufficientCoins:
+        return await sign.finish(f"{giver.nickname} 已经被薅空了，请稍后再试")
 
     # 写入签到记录
-    new_sign = Sign(qid=user_id, earned_coins=earned_coins)
-
-    session.add(new_sign)
-    session.add(giver)
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    session.refresh(giver)
+    session.add(Sign(qid=user_id, earned_coins=earned_coins))
+    await session.commit()
 
     await sign.send(
         f'签到成功，从 {giver.nickname} 身上薅了 {earned_coins} 硬币！\n'
-        f'当前余额：{user.coins} 对方剩余：{giver.coins}',
+        f'当前余额：{result.to_balance} 对方剩余：{result.from_balance}',
         at_sender=True
     )
 
@@ -5,8 +5,10 @@ from nonebot.permission import SUPERUSER
 from sqlmodel import select, func
 from datetime import datetime
 
-from ..core.db.deps import SessionDep
-from ..core.db.models import User, BetEvent, BetOption, BetRecord
+from ..core import ledger, betting
+from ..core.db.deps import AsyncSessionDep
+from ..core.db.models import User, BetEvent, BetOption, BetRecord, TransactionType
+from ..core.ledger import InsufficientCoins
 
 bet = on_command('bet')
 bet_info = on_command('bet_info', aliases={'betinfo'})
@@ -17,22 +19,20 @@ mybets = on_command("mybet", aliases={"mybets", "bets"})
 
 
 @mybets.handle()
-async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg()):
+async def _(event: MessageEvent, session: AsyncSessionDep, arg: Message = CommandArg()):
     user_id = event.get_user_id()
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         return await mybets.finish("用户不存在，请先绑定SteamID", at_sender=True)
 
-    now = datetime.now()
     # 优先查找当前进行中的赛事
-    statement = select(BetEvent).where(BetEvent.start_time <= now, BetEvent.end_time > now).order_by(BetEvent.start_time.desc())
-    events = session.exec(statement).all()
+    events = (await betting.get_active_event(session)).events
 
     if events:
         event_id = events[0].id
     else:
         # 如果没有正在进行的赛事，退而求其次找最新一场（已结束）赛事
-        latest_event = session.exec(select(BetEvent).order_by(BetEvent.start_time.desc())).first()
+        latest_event = (await session.exec(select(BetEvent).order_by(BetEvent.start_time.desc()))).first()
         if not latest_event:
             return await mybets.finish("尚未创建任何赛事", at_sender=True)
         event_id = latest_event.id
@@ -44,11 +44,11 @@ async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg(
         .order_by(BetRecord.created_at.desc())
     )
 
-    results = session.exec(stmt).all()
+    results = (await session.exec(stmt)).all()
     if not results:
         return await mybets.finish("你在该赛事中尚未投注任何选项", at_sender=True)
 
-    bet_event = session.get(BetEvent, event_id)
+    bet_event = await session.get(BetEvent, event_id)
     content = f"赛事: {bet_event.name}（ID: {bet_event.id}）的投注记录：\n"
     for record, option in results:
         content += (
@@ -61,44 +61,40 @@ async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg(
 
 
 @signup.handle()
-async def _(event: MessageEvent, session: SessionDep):
+async def _(event: MessageEvent, session: AsyncSessionDep):
     user_id = event.get_user_id()
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         return await signup.finish("用户不存在，请先绑定 SteamID", at_sender=True)
 
-    now = datetime.now()
-    events = session.exec(
-        select(BetEvent).where(BetEvent.start_time <= now, BetEvent.end_time > now)
-    ).all()
+    active = await betting.get_active_event(session)
+    if active.error:
+        return await signup.finish(active.error, at_sender=True)
 
-    if not events:
-        return await signup.finish("当前没有正在进行的赛事", at_sender=True)
-    if len(events) > 1:
-        return await signup.finish("检测到多个正在进行的赛事，请联系管理员", at_sender=True)
-
-    current_event = events[0]
+    current_event = active.current
 
     # Check if already signed up
-    existing = session.exec(
+    existing = (await session.exec(
         select(BetOption).where(
             BetOption.event_id == current_event.id,
             BetOption.qid == user.qid
         )
-    ).first()
+    )).first()
     if existing:
         if existing.is_cancelled:
             existing.is_cancelled = False
             existing.updated_at = datetime.now()
             session.add(existing)
-            session.commit()
+            await session.commit()
+            betting.invalidate_pool(current_event.id)
+            betting.add_active_option(existing)
             return await signup.finish("重新激活报名成功！", at_sender=True)
         return await signup.finish("你已经报名过了！", at_sender=True)
 
     # Assign option_id as 1-based incremental within this event
-    max_option_id = session.exec(
+    max_option_id = (await session.exec(
         select(func.max(BetOption.option_id)).where(BetOption.event_id == current_event.id)
-    ).one() or 0
+    )).one() or 0
 
     new_option = BetOption(
         option_id=max_option_id + 1,
@@ -109,13 +105,15 @@ async def _(event: MessageEvent, session: SessionDep):
         is_cancelled=False
     )
     session.add(new_option)
-    session.commit()
+    await session.commit()
+    betting.invalidate_pool(current_event.id)
+    betting.add_active_option(new_option)
 
     await signup.finish(f"报名成功！选手编号为 {new_option.option_id}")
 
 
 @checkout.handle()
-async def _(session: SessionDep, args: Message = CommandArg()):
+async def _(session: AsyncSessionDep, args: Message = CommandArg()):
     args = args.extract_plain_text().strip().split()
     if len(args) != 2:
         return await checkout.finish("Usage: /结账 <event_id> <option_id>")
@@ -127,79 +125,42 @@ async def _(session: SessionDep, args: Message = CommandArg()):
     except ValueError:
         return await checkout.finish("Event ID and Option ID must be integers.")
 
-    bet_event = session.get(BetEvent, event_id)
+    bet_event = await session.get(BetEvent, event_id)
     if not bet_event:
         return await checkout.finish(f"No event found with ID {event_id}")
 
-    winning_option = session.get(BetOption, (option_id, event_id))  # ✅ tuple of keys
+    winning_option = await session.get(BetOption, (option_id, event_id))  # ✅ tuple of keys
     if not winning_option or winning_option.event_id != event_id:
         return await checkout.finish(f"No valid option found with ID {option_id} for event {event_id}")
 
-    bet_event.result_option_id = option_id
-
-    total_bets_query = select(func.sum(BetRecord.bet_amount)).where(BetRecord.event_id == event_id)
-    total_bets = session.exec(total_bets_query).one() or 0
-
-    winning_bets_query = select(func.sum(BetRecord.bet_amount)).where(
-        BetRecord.option_id == option_id,
-        BetRecord.event_id == event_id
-    )
-    winning_bets = session.exec(winning_bets_query).one() or 0
-
-    if winning_bets == 0:
+    try:
+        settlement = await betting.settle_event(session, event_id, option_id)
+    except betting.EventAlreadySettled:
+        return await checkout.finish(f"Event {event_id} has already been settled.")
+    if settlement is None:
         return await checkout.finish("No bets placed on the winning option.")
-
-    odds = total_bets / winning_bets
+    await session.commit()
+    betting.invalidate_active_event()
 
     results = []
-    net_wins = {}
-
-    winning_bets_query = select(BetRecord).where(
-        BetRecord.option_id == option_id,
-        BetRecord.event_id == event_id
-    )
-    winning_bets = session.exec(winning_bets_query).all()
-    for bet_ in winning_bets:
-        user = session.get(User, bet_.user_id)
-        if not user:
-            continue
-        win_amount = bet_.bet_amount * odds
-        user.coins += int(win_amount)
-        session.add(user)
-        net_wins[user.qid] = net_wins.get(user.qid, 0) + win_amount - bet_.bet_amount
-        results.append(f"{user.nickname} +{win_amount:.2f} 硬币")
-
-    losing_bets_query = select(BetRecord).where(
-        BetRecord.option_id != option_id,
-        BetRecord.event_id == event_id
-    )
-    losing_bets = session.exec(losing_bets_query).all()
-    for bet_ in losing_bets:
-        user = session.get(User, bet_.user_id)
-        if not user:
-            continue
-        lose_amount = bet_.bet_amount
-        net_wins[user.qid] = net_wins.get(user.qid, 0) - lose_amount
-        results.append(f"{user.nickname} -{lose_amount:.2f} 硬币")
-
-    session.commit()
+    for line in settlement.lines:
+        if line.payout:
+            results.append(f"{line.nickname} +{line.payout:.2f} 硬币")
+        if line.lost:
+            results.append(f"{line.nickname} -{line.lost:.2f} 硬币")
     result_message = "\n".join(results)
     await checkout.send(result_message)
 
-    sorted_net_wins = sorted(net_wins.items(), key=lambda x: x[1], reverse=True)
-    net_win_results = []
-    for user_id, net_win in sorted_net_wins:
-        user = session.get(User, user_id)
-        if not user:
-            continue
-        net_win_results.append(f"{user.nickname} {'赢得了' if net_win >= 0 else '输掉了'} {abs(net_win):.2f} 硬币")
-
+    net_win_results = [
+        f"{line.nickname} {'赢得了' if line.net >= 0 else '输掉了'} {abs(line.net):.2f} 硬币"
+        for line in settlement.lines
+    ]
     net_win_message = "\n".join(net_win_results)
     await checkout.finish(net_win_message)
 
 
 @bet.handle()
-async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg()):
+async def _(event: MessageEvent, session: AsyncSessionDep, arg: Message = CommandArg()):
     args = arg.extract_plain_text().strip().split()
     if len(args) != 2:
         return await bet.finish("请使用正确的格式: /bet <选项ID或选手昵称> <金额>")
@@ -214,41 +175,30 @@ async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg(
         return await bet.finish("投注金额必须大于0")
 
     user_id = event.get_user_id()
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         return await bet.finish("用户不存在，请先绑定SteamID")
 
     if user.coins < amount:
         return await bet.finish(f"您的余额不足，当前余额: {user.coins}")
 
-    now = datetime.now()
-    statement = select(BetEvent).where(BetEvent.start_time <= now, BetEvent.end_time > now)
-    events = session.exec(statement).all()
-
-    if not events:
-        return await bet.finish("当前没有正在进行的赛事")
-    if len(events) > 1:
-        return await bet.finish("检测到多个正在进行的赛事，请联系管理员")
+    active = await betting.get_active_event(session)
+    if active.error:
+        return await bet.finish(active.error)
 
-    current_event = events[0]
+    current_event = active.current
 
     # 判断是ID还是昵称
     option: BetOption | None = None
 
     if name_or_id.isdigit():
         option_id = int(name_or_id)
-        option = session.get(BetOption, (option_id, current_event.id))
+        option = active.options.get(option_id)
         if not option:
             return await bet.finish("未找到相关选项，请检查选项ID是否正确")
     else:
-        # 昵称匹配（模糊忽略大小写）
-        options = session.exec(
-            select(BetOption).where(
-                BetOption.event_id == current_event.id,
-                BetOption.option_name.ilike(f"%{name_or_id}%"),
-                BetOption.is_cancelled == False
-            )
-        ).all()
+        # 昵称匹配（完全匹配优先，其次模糊忽略大小写、拼音首字母）
+        options = active.name_index.match(name_or_id)
         if not options:
             return await bet.finish("未找到匹配的选手昵称")
         if len(options) > 1:
@@ -262,17 +212,23 @@ async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg(
     if current_event.result_option_id is not None:
         return await bet.finish("该赛事已经结束，无法继续投注")
 
-    user.coins -= amount
-    session.add(user)
+    try:
+        result = await ledger.transfer(
+            session, user.qid, None, amount,
+            type=TransactionType.BET_PLACED,
+            description=f"投注 {current_event.name} 选手 {option.option_name}",
+        )
+    except InsufficientCoins:
+        return await bet.finish(f"您的余额不足，需要: {amount}")
 
     # 判断是否已有投注记录，叠加金额
-    existing_bet = session.exec(
+    existing_bet = (await session.exec(
         select(BetRecord).where(
             BetRecord.user_id == user_id,
             BetRecord.event_id == current_event.id,
             BetRecord.option_id == option.option_id
         )
-    ).first()
+    )).first()
 
     if existing_bet:
         existing_bet.bet_amount += amount
@@ -286,74 +242,46 @@ async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg(
         )
         session.add(bet_record)
 
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    betting.record_bet(current_event.id, option.option_id, amount)
 
     await bet.finish(
         f"投注成功！\n"
         f"选项ID: {option.option_id}\n"
         f"选手昵称: {option.option_name}\n"
         f"投注金额: {amount}\n"
-        f"当前余额: {user.coins}"
+        f"当前余额: {result.from_balance}"
     )
 
 
 @bet_info.handle()
-async def handle_bet_info(event: MessageEvent, session: SessionDep, arg: Message = CommandArg()):
+async def handle_bet_info(event: MessageEvent, session: AsyncSessionDep, arg: Message = CommandArg()):
     args = arg.extract_plain_text().strip()
-    now = datetime.now()
 
     if args:
         try:
             event_id = int(args)
         except ValueError:
             return await bet_info.finish("请输入有效的赛事ID")
-        bet_event = session.get(BetEvent, event_id)
+        bet_event = await session.get(BetEvent, event_id)
     else:
-        statement = select(BetEvent).where(BetEvent.start_time <= now, BetEvent.end_time > now)
-        events = session.exec(statement).all()
-
-        if not events:
-            return await bet_info.finish("当前没有正在进行的赛事")
-        if len(events) > 1:
-            return await bet_info.finish("检测到多个正在进行的赛事，请联系管理员")
+        active = await betting.get_active_event(session)
+        if active.error:
+            return await bet_info.finish(active.error)
 
-        bet_event = events[0]
+        bet_event = active.current
 
     if not bet_event:
         return await bet_info.finish("未找到相关赛事")
 
-    statement = select(BetOption).where(BetOption.event_id == bet_event.id)
-    options = session.exec(statement).all()
-
-    if not options:
+    pool = await betting.get_pool(session, bet_event.id)
+    if not pool.options:
         return await bet_info.finish("该赛事暂无投注选项")
 
-    total_bets_query = select(func.sum(BetRecord.bet_amount)).where(BetRecord.event_id == bet_event.id)
-    total_bets = session.exec(total_bets_query).one() or 0
-
     content = f"赛事: {bet_event.name}\n描述: {bet_event.description}\n"
     content += "投注选项:\n"
 
-    option_odds_list = []
-    for option in options:
-        option_bets_query = select(func.sum(BetRecord.bet_amount)).where(
-            BetRecord.option_id == option.option_id,
-            BetRecord.event_id == bet_event.id
-        )
-        option_bets = session.exec(option_bets_query).one() or 0
-        odds = total_bets / option_bets if option_bets > 0 else 0
-        option_odds_list.append({
-            'id': option.option_id,
-            'name': option.option_name,
-            'odds': odds,
-            'option_bets': option_bets
-        })
-
-    option_odds_list = sorted(
-        option_odds_list,
-        key=lambda x: (x['odds'] == 0, x['odds'])
-    )
+    option_odds_list = pool.odds()
 
     for option in option_odds_list:
         content += (
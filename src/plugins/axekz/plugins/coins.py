@@ -13,11 +13,11 @@ from nonebot.adapters.onebot.v11 import (
 )
 from nonebot.log import logger
 from nonebot_plugin_apscheduler import scheduler
-from sqlmodel import Session
-
-from src.plugins.axekz.core import get_bank, User, engine
-from src.plugins.axekz.core.db.deps import SessionDep
-from src.plugins.axekz.core.db.models import CoinTransaction, TransactionType
+from src.plugins.axekz.core import BANK_QID, User, ledger
+from src.plugins.axekz.core.db.deps import AsyncSessionDep, new_session
+from src.plugins.axekz.core.db.models import TransactionType
+from src.plugins.axekz.core.ledger import InsufficientCoins
+from src.plugins.axekz.core.utils.rules import reply_to_tracked
 
 # === your project deps (adjust paths/names if different) ===
 
@@ -60,10 +60,9 @@ async def _finalize_if_unclaimed(group_id: int, bot_message_id: int):
     if not bot:
         return
 
-    # OPEN A REAL SESSION HERE (not SessionDep)
-    with Session(engine) as session:
-        quitter: User | None = session.get(User, pkt.quitter_qid)
-        bank = get_bank()
+    # OPEN A REAL SESSION HERE (not AsyncSessionDep)
+    async with new_session() as session:
+        quitter: User | None = await session.get(User, pkt.quitter_qid)
         if not quitter:
             _pending.pop(key, None)
             return
@@ -73,26 +72,17 @@ async def _finalize_if_unclaimed(group_id: int, bot_message_id: int):
             _pending.pop(key, None)
             return
 
-        quitter.coins -= amount
-        bank.coins += amount
-
-        session.add_all([
-            CoinTransaction(
-                user_id=quitter.qid,
-                amount=-amount,
+        try:
+            await ledger.transfer(
+                session, quitter.qid, BANK_QID, amount,
                 type=TransactionType.LJPK,  # swap to RED_PACKET if you add it
-                description="退群红包无人领取，转入国库"
-            ),
-            CoinTransaction(
-                user_id="bank",
-                amount=amount,
-                type=TransactionType.LJPK,
-                description=f"退群红包超时入库（来自 {quitter.nickname}）"
-            ),
-            bank,
-            quitter,
-        ])
-        session.commit()
+                description="退群红包无人领取，转入国库",
+                to_description=f"退群红包超时入库（来自 {quitter.nickname}）",
+            )
+        except InsufficientCoins:
+            _pending.pop(key, None)
+            return
+        await session.commit()
 
     try:
         await bot.send_group_msg(group_id=group_id, message=f"⏳ 无人领取，红包已入库（{amount}）")
@@ -109,7 +99,7 @@ leave_notice = on_notice(priority=5, block=False)
 
 
 @leave_notice.handle()
-async def _(bot: Bot, event: GroupDecreaseNoticeEvent, session: SessionDep):
+async def _(bot: Bot, event: GroupDecreaseNoticeEvent, session: AsyncSessionDep):
     """
     Triggered when a user quits/is kicked from a group.
     If quitter has coins > 0, post a descriptive '抢红包' message and open a 60s claim window.
@@ -118,7 +108,7 @@ async def _(bot: Bot, event: GroupDecreaseNoticeEvent, session: SessionDep):
     quitter_qid = str(event.user_id)
 
     # Fetch user & coins
-    user: User | None = session.get(User, quitter_qid)
+    user: User | None = await session.get(User, quitter_qid)
     if not user or user.coins <= 0:
         return  # nothing to do
 
@@ -168,11 +158,11 @@ async def _(bot: Bot, event: GroupDecreaseNoticeEvent, session: SessionDep):
 # ─────────────────────────────────────────────────────────────
 # Message: handle replies to claim the red packet
 # ─────────────────────────────────────────────────────────────
-claim_handler = on_message(priority=6, block=False)
+claim_handler = on_message(rule=reply_to_tracked(_pending), priority=6, block=False)
 
 
 @claim_handler.handle()
-async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep):
+async def _(bot: Bot, event: GroupMessageEvent, session: AsyncSessionDep):
     """
     First user who REPLIES to the bot's '抢红包' message within 60s gets all coins.
     """
@@ -203,9 +193,9 @@ async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep):
 
     # Transfer coins: quitter -> claimer
     claimer_qid = pkt.claimer_qid
-    with session as s:
-        quitter: User | None = s.get(User, pkt.quitter_qid)
-        claimer: User | None = s.get(User, claimer_qid)
+    async with session as s:
+        quitter: User | None = await s.get(User, pkt.quitter_qid)
+        claimer: User | None = await s.get(User, claimer_qid)
         if not quitter or not claimer:
             pkt.claimed = False  # roll back marker, though unlikely useful now
             return
@@ -218,35 +208,19 @@ async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep):
         tax = math.ceil(transfer_amount * 0.30)
         net = transfer_amount - tax
 
-        quitter.coins -= transfer_amount
-        claimer.coins += net
-        bank = get_bank()
-        bank.coins += tax
-
-        s.add_all([
-            CoinTransaction(
-                user_id=quitter.qid,
-                amount=-transfer_amount,
+        try:
+            await ledger.transfer(
+                s, quitter.qid, claimer.qid, transfer_amount,
+                tax=tax,
                 type=TransactionType.LJPK,  # or RED_PACKET if you have it
-                description=f"退群红包被领取，转出 {transfer_amount} 给 {claimer.nickname}（含税）"
-            ),
-            CoinTransaction(
-                user_id=claimer.qid,
-                amount=net,
-                type=TransactionType.LJPK,
-                description=f"领取退群红包（实得 {net}，已扣遗产税 {tax}）来自 {quitter.nickname}"
-            ),
-            CoinTransaction(
-                user_id="bank",
-                amount=tax,
-                type=TransactionType.LJPK,
-                description=f"退群红包遗产税（来自 {quitter.nickname}）"
-            ),
-            quitter,
-            claimer,
-            bank,
-        ])
-        s.commit()
+                description=f"退群红包被领取，转出 {transfer_amount} 给 {claimer.nickname}（含税）",
+                to_description=f"领取退群红包（实得 {net}，已扣遗产税 {tax}）来自 {quitter.nickname}",
+                tax_description=f"退群红包遗产税（来自 {quitter.nickname}）",
+            )
+        except InsufficientCoins:
+            pkt.claimed = False
+            return
+        await s.commit()
 
     # Announce winner
     try:
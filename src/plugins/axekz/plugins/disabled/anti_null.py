@@ -2,7 +2,7 @@ from nonebot import Bot, on_message
 from nonebot.adapters.onebot.v11 import GroupMessageEvent
 
 from src.plugins.axekz import axekz_config
-from src.plugins.axekz.core.db.deps import SessionDep
+from src.plugins.axekz.core.db.deps import AsyncSessionDep
 from src.plugins.axekz.core.db.models import User
 
 anti_null = on_message(priority=15)
@@ -18,12 +18,12 @@ async def handle_ban(bot: Bot, event: GroupMessageEvent, keyword: str):
 
 
 @anti_null.handle()
-async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep):
+async def _(bot: Bot, event: GroupMessageEvent, session: AsyncSessionDep):
     if event.group_id != axekz_config.group_id:
         return
     if str(event.user_id) in whitelist:
         return
-    user: User | None = session.get(User, event.user_id)
+    user: User | None = await session.get(User, event.user_id)
     if user and user.is_whitelist:
         return
 
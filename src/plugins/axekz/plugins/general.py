@@ -10,9 +10,10 @@ import base64
 import time
 
 from . import BIND_PROMPT
-from ..core import get_bank
+from ..core import BANK_QID, ledger
 from ..core.db.models import User, CoinTransaction, TransactionType
-from ..core.db.deps import SessionDep
+from ..core.db.deps import AsyncSessionDep
+from ..core.ledger import InsufficientCoins
 from ..core.utils.command_helper import CommandData
 from ..core.utils.convertors import convert_steamid
 from ..core.utils.formatters import format_kzmode
@@ -45,7 +46,7 @@ def decode_bind_token(token: str, secret: str) -> tuple[int, int]:
 
 
 @bind_token.handle()
-async def handle_bind_token(bot: Bot, event: MessageEvent, session: SessionDep):
+async def handle_bind_token(bot: Bot, event: MessageEvent, session: AsyncSessionDep):
     # 如果不是私聊，则提醒用户去私聊使用
     if not isinstance(event, PrivateMessageEvent):
         try:
@@ -80,8 +81,8 @@ async def handle_bind_token(bot: Bot, event: MessageEvent, session: SessionDep):
     user = User(qid=user_id, steamid=steamid, nickname=nickname)
     try:
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
     except IntegrityError:
         return await bind_token.finish("该 QQ 已绑定过，不需要重复绑定。", at_sender=True)
 
@@ -90,7 +91,7 @@ async def handle_bind_token(bot: Bot, event: MessageEvent, session: SessionDep):
 
 
 @transactions.handle()
-async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg()):
+async def _(event: MessageEvent, session: AsyncSessionDep, arg: Message = CommandArg()):
     user_id = event.get_user_id()
     try:
         n = int(arg.extract_plain_text().strip()) if arg.extract_plain_text().strip() else 5
@@ -104,7 +105,7 @@ async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg(
         .order_by(CoinTransaction.created_at.desc())
         .limit(n)
     )
-    results = session.exec(stmt).all()
+    results = (await session.exec(stmt)).all()
 
     if not results:
         return await transactions.finish("你还没有任何硬币账单记录", at_sender=True)
@@ -121,9 +122,9 @@ async def _(event: MessageEvent, session: SessionDep, arg: Message = CommandArg(
 
 
 @special_title.handle()
-async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(bot: Bot, event: GroupMessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
 
@@ -135,39 +136,28 @@ async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep, args: Messa
     if len(title) > length:
         return await special_title.send(f'头衔过长，不能大于 {length} 个字符', at_sender=True)
 
-    user.coins -= TITLE_COST
-
-    # 给银行转账
-    bank = get_bank()
-    bank.coins += TITLE_COST
-
-    # 添加交易记录
-    transaction = CoinTransaction(
-        user_id=user.qid,
-        amount=-TITLE_COST,
-        type=TransactionType.PURCHASE,
-        description=f"设置头衔为「{title}」"
-    )
-
-    session.add_all([user, bank, transaction])
-
     try:
-        session.commit()
-        session.refresh(user)
-        session.refresh(bank)
+        result = await ledger.transfer(
+            session, user.qid, BANK_QID, TITLE_COST,
+            type=TransactionType.PURCHASE,
+            description=f"设置头衔为「{title}」",
+        )
+        await session.commit()
+    except InsufficientCoins:
+        return await special_title.finish(f"没有足够的硬币，需要 {TITLE_COST}", at_sender=True)
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(e)
         return await special_title.finish(repr(e), at_sender=True)
 
     await bot.set_group_special_title(group_id=event.group_id, user_id=event.user_id, special_title=title)
-    return await special_title.send(f'头衔 {title} 设置成功, 花费 {TITLE_COST}, 余额 {user.coins}', at_sender=True)
+    return await special_title.send(f'头衔 {title} 设置成功, 花费 {TITLE_COST}, 余额 {result.from_balance}', at_sender=True)
 
 
 @rename.handle()
-async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(event: MessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
     elif user.coins < RENAME_COST:
@@ -178,35 +168,27 @@ async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg
         return await rename.finish(f'请输入昵称, 改名需花费 {RENAME_COST} 硬币', at_sender=True)
 
     user.nickname = name
-    user.coins -= RENAME_COST
-
-    bank = get_bank()
-    bank.coins += RENAME_COST
-
-    # 添加交易记录
-    transaction = CoinTransaction(
-        user_id=user.qid,
-        amount=-RENAME_COST,
-        type=TransactionType.PURCHASE,
-        description=f"修改昵称为「{name}」"
-    )
-
-    session.add_all([user, bank, transaction])
+    session.add(user)
     try:
-        session.commit()
-        session.refresh(user)
-        session.refresh(bank)
+        result = await ledger.transfer(
+            session, user.qid, BANK_QID, RENAME_COST,
+            type=TransactionType.PURCHASE,
+            description=f"修改昵称为「{name}」",
+        )
+        await session.commit()
+    except InsufficientCoins:
+        return await rename.finish(f'您的余额不足\n需要: {RENAME_COST}', at_sender=True)
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(e)
         return await rename.finish(repr(e), at_sender=True)
 
-    return await rename.finish(f'成功修改昵称为: {user.nickname}\n余额: {user.coins} (-{RENAME_COST})', at_sender=True)
+    return await rename.finish(f'成功修改昵称为: {user.nickname}\n余额: {result.from_balance} (-{RENAME_COST})', at_sender=True)
 
 
 @info.handle()
 async def _(event: MessageEvent, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         return await info.send(cd.error, at_sender=True)
     user = cd.user2 if cd.user2 else cd.user1
@@ -214,7 +196,7 @@ async def _(event: MessageEvent, args: Message = CommandArg()):
 
 
 @add_user.handle()
-async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(event: MessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     at_msg = event.get_message().copy()
     qid = None
     for segment in at_msg:
@@ -233,16 +215,16 @@ async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg
             nickname=nickname
         )
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
 
         await add_user.send('添加成功\n' + str(user), at_sender=True)
 
 
 @mode.handle()
-async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(event: MessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         # user = await bind_steamid(event, session)
         return
@@ -257,14 +239,14 @@ async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg
 
     user.mode = mode_
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
 
     await mode.finish(MessageSegment.reply(event.message_id) + f"模式已更新为: {mode_}", at_sender=True)
 
 
 @bind.handle()
-async def bind_steamid(event: MessageEvent, session: SessionDep):
+async def bind_steamid(event: MessageEvent, session: AsyncSessionDep):
     user_id = event.get_user_id()
     data = await api_get(f'/players/qq/{user_id}', timeout=20)
     steamid = data.get('steamid', None)
@@ -284,8 +266,8 @@ async def bind_steamid(event: MessageEvent, session: SessionDep):
     )
     try:
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
     except IntegrityError as e:
         return await bind.finish(f"用户已存在", at_sender=True)
 
@@ -2,7 +2,7 @@ import asyncio
 import re
 from json import JSONDecodeError
 
-import httpx
+from aiohttp import ContentTypeError
 import nonebot
 from nonebot import on_request
 from nonebot.adapters.onebot.v11.bot import Bot
@@ -10,8 +10,9 @@ from nonebot.adapters.onebot.v11.event import GroupRequestEvent
 from nonebot.adapters.onebot.v11.message import MessageSegment
 
 from .. import axekz_config
-from ..core.db.deps import SessionDep
+from ..core.db.deps import AsyncSessionDep
 from ..core.db.models import User
+from ..core.utils.helpers import aio_get
 
 join_group = on_request(
     priority=1,
@@ -30,22 +31,20 @@ def validate_steamid(steamid):
 
 async def check_comment(comment):
     url = f'https://api.gokz.top/leaderboard/{comment}?mode=kz_timer'
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url)
-        try:
-            resp = resp.json()
-        except JSONDecodeError:
-            return False
-        if len(resp) == 0:
-            return False
-        else:
-            return resp.get('name', False)
+    try:
+        resp = await aio_get(url)
+    except (JSONDecodeError, ContentTypeError):
+        return False
+    if len(resp) == 0:
+        return False
+    else:
+        return resp.get('name', False)
 
 
 @join_group.handle()
-async def _grh(bot: Bot, event: GroupRequestEvent, session: SessionDep):
+async def _grh(bot: Bot, event: GroupRequestEvent, session: AsyncSessionDep):
     if event.sub_type == 'add':
-        user: User | None = session.get(User, event.user_id)
+        user: User | None = await session.get(User, event.user_id)
         # 白名单群
         if event.group_id == axekz_config.mini_group_id:
             if not user:
@@ -6,13 +6,13 @@ from itertools import islice
 from nonebot import logger, on_command
 from nonebot.adapters.onebot.v11 import MessageEvent, Message
 from nonebot.params import CommandArg
-from sqlmodel import select, Session
+from sqlmodel import select
 
-from ..core import get_bank
-from ..core.db import engine
+from ..core import ledger
 from ..core.db.crud import get_user_lee
-from ..core.db.deps import SessionDep
-from ..core.db.models import User, LeeWords
+from ..core.db.deps import AsyncSessionDep, new_session
+from ..core.db.models import User, LeeWords, TransactionType
+from ..core.ledger import InsufficientCoins
 from ..plugins.general import bind_steamid
 
 try:
@@ -25,10 +25,10 @@ except Exception as e:
     logger.error(e)
 
 
-def random_lee_word() -> str:
-    with Session(engine) as session:
+async def random_lee_word() -> str:
+    async with new_session() as session:
         statement = select(LeeWords).where(LeeWords.explicit == 0)
-        results = session.exec(statement).all()
+        results = (await session.exec(statement)).all()
         if not results:
             return "No 李语 found in the database."
         return str(random.choice(results))
@@ -56,9 +56,9 @@ lee_all = on_command('lee_all')
 
 
 @lee_all.handle()
-async def _(event: MessageEvent, session: SessionDep):
+async def _(event: MessageEvent, session: AsyncSessionDep):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
 
@@ -66,7 +66,7 @@ async def _(event: MessageEvent, session: SessionDep):
         return await lee_all.send('非管理员，无法查看所有李语')
 
     statement = select(LeeWords)
-    lee_words = session.exec(statement).all()
+    lee_words = (await session.exec(statement)).all()
     if not lee_words:
         return await lee_all.send('No LeeWords')
 
@@ -84,9 +84,9 @@ async def _(event: MessageEvent, session: SessionDep):
 
 
 @lee_set.handle()
-async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(event: MessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
 
@@ -103,7 +103,7 @@ async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg
     # except TypeError:
     #     is_explicit = None
 
-    lee_word: LeeWords = session.get(LeeWords, id)
+    lee_word: LeeWords = await session.get(LeeWords, id)
     if not lee_word:
         return await lee_set.send(f'id {id} 的李语不存在')
 
@@ -115,15 +115,15 @@ async def _(event: MessageEvent, session: SessionDep, args: Message = CommandArg
         lee_word.content = content
 
     session.add(lee_word)
-    session.commit()
-    session.refresh(lee_word)
+    await session.commit()
+    await session.refresh(lee_word)
     return await lee_set.send(lee_word.info())
 
 
 @lee_add.handle()
-async def send_lee_lang(event: MessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def send_lee_lang(event: MessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
 
@@ -135,15 +135,15 @@ async def send_lee_lang(event: MessageEvent, session: SessionDep, args: Message
         explicit=False
     )
     session.add(lee_words)
-    session.commit()
-    session.refresh(lee_words)
+    await session.commit()
+    await session.refresh(lee_words)
     return await lee_add.send('李语添加成功!\n' + str(lee_words))
 
 
 @lee_lang.handle()
-async def send_lee_lang(event: MessageEvent, session: SessionDep):
+async def send_lee_lang(event: MessageEvent, session: AsyncSessionDep):
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
 
@@ -151,24 +151,24 @@ async def send_lee_lang(event: MessageEvent, session: SessionDep):
     if user.coins < price:
         return await lee_lang.send(f'这样吧，你先给我 {price} 硬币，我就给你讲述一遍我的名言', at_sender=True)
 
-    lee = get_user_lee()
+    lee = await get_user_lee()
 
     if user.qid != lee.qid:
-        user.coins -= price
-
-        # 拆分 price 的一半给 lee 和央行
-        lee_share = math.floor(price / 2)   # 向下取整
+        # 拆分 price 的一半给 lee 和央行，lee 得到向下取整的 price - bank_share
         bank_share = math.ceil(price / 2)   # 向上取整，保证两者和为 price
 
-        lee.coins += lee_share
-
-        bank = get_bank()
-        bank.coins += bank_share
-
-        session.add(user)
-        session.add(lee)
-        session.add(bank)
-        session.commit()
-
-    await lee_lang.send(random_lee_word(), at_sender=True)
+        try:
+            await ledger.transfer(
+                session, user.qid, lee.qid, price,
+                tax=bank_share,
+                type=TransactionType.PURCHASE,
+                description="购买李语",
+                to_description=f"李语分成（来自 {user.nickname}）",
+                tax_description=f"李语税收（来自 {user.nickname}）",
+            )
+        except InsufficientCoins:
+            return await lee_lang.send(f'这样吧，你先给我 {price} 硬币，我就给你讲述一遍我的名言', at_sender=True)
+        await session.commit()
+
+    await lee_lang.send(await random_lee_word(), at_sender=True)
     return None
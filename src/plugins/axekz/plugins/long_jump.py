@@ -1,29 +1,37 @@
+import asyncio
 import math
 import random
-import re
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import chain
 from textwrap import dedent
 from typing import Optional
 
+import nonebot
 from nonebot import on_message, get_bot, logger, get_bots
 from nonebot.adapters.onebot.v11 import MessageSegment, MessageEvent, Message, Bot, GroupMessageEvent
 from nonebot.params import CommandArg
+from nonebot.permission import SUPERUSER
 from nonebot.plugin import on_command
 from nonebot_plugin_apscheduler import scheduler
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .general import bind_steamid
-from ..core import get_bank
-from ..core.db.crud import get_ljpk_stats
-from ..core.db.deps import SessionDep
-from ..core.db.models import User, LJPKRecord, CoinTransaction, TransactionType
+from .. import axekz_config
+from ..core import ledger, lj_engine
+from ..core.db.crud import get_ljpk_stats, record_ljpk_match, rebuild_ljpk_player_stats
+from ..core.db.deps import AsyncSessionDep, new_session
+from ..core.db.models import User, LJPKRecord, TransactionType
+from ..core.ledger import InsufficientCoins
 from ..core.utils.command_helper import CommandData
 from ..core.utils.helpers import api_get
+from ..core.utils.rules import reply_to_tracked
 
 lj = on_command('lj')
 ljpb = on_command('ljpb')
 ljpk = on_command('ljpk')
-accept_game = on_message(priority=2, block=False)
+ljpk_rebuild = on_command('ljpk_rebuild', permission=SUPERUSER)
 
 
 class LJPKSession:
@@ -35,51 +43,170 @@ class LJPKSession:
         self.created_at: datetime = datetime.now()
         self.bot_message_id: Optional[int] = None  # 新增：记录机器人发送的消息 ID
 
-    def get_users(self, session: Session) -> tuple[type[User] | None, type[User] | None]:
-        user1 = session.get(User, self.qid1)
-        user2 = session.get(User, self.qid2) if self.qid2 else None
+    async def get_users(self, session: AsyncSession) -> tuple[User | None, User | None]:
+        user1 = await session.get(User, self.qid1)
+        user2 = await session.get(User, self.qid2) if self.qid2 else None
         return user1, user2
 
     def set_opponent(self, qid: str):
         self.qid2 = qid
 
 
-ljpk_sessions: list[LJPKSession] = []
+class LJPKRegistry:
+    """进行中的 LJPK，按 (group_id, bot_message_id) 和 (group_id, 发起人) 建立索引"""
 
+    def __init__(self):
+        self._by_message: dict[tuple[int, int], LJPKSession] = {}
+        self._by_initiator: dict[tuple[int, str], LJPKSession] = {}
 
-async def clean_expire_session(bot: Bot, expiration_minutes: int = 2):
-    global ljpk_sessions
-    if not ljpk_sessions:
-        return
+    def add(self, pk_session: LJPKSession):
+        self._by_message[(pk_session.group_id, pk_session.bot_message_id)] = pk_session
+        self._by_initiator[(pk_session.group_id, pk_session.qid1)] = pk_session
+
+    def get(self, group_id: int, message_id: int) -> LJPKSession | None:
+        return self._by_message.get((group_id, message_id))
+
+    def get_by_initiator(self, group_id: int, qid: str) -> LJPKSession | None:
+        return self._by_initiator.get((group_id, qid))
+
+    def remove(self, pk_session: LJPKSession) -> bool:
+        """移除对局，返回是否由本次调用移除（用于防止同一对局被重复结算）"""
+        if self._by_message.pop((pk_session.group_id, pk_session.bot_message_id), None) is None:
+            return False
+        self._by_initiator.pop((pk_session.group_id, pk_session.qid1), None)
+        return True
+
+    def __contains__(self, key: tuple[int, int]) -> bool:
+        return key in self._by_message
+
+
+ljpk_sessions = LJPKRegistry()
+accept_game = on_message(rule=reply_to_tracked(ljpk_sessions), priority=2, block=False)
+
+SESSION_EXPIRE_SEC = 120
+
+
+class LJSampleBuffer:
+    """
+    按模式预先批量准备的随机 LJ 样本。
+    启用本地引擎时样本不足即由引擎一次生成 engine_batch_size 条；否则低于水位时在后台向 /casual/lj 补充。
+    """
+
+    def __init__(self, batch_size: int = 50, low_water: int = 10, engine_batch_size: int = 10_000):
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.engine_batch_size = engine_batch_size
+        self.engine: lj_engine.LJEngine | None = None
+        self._samples: dict[str, deque] = {}
+        self._refills: dict[str, asyncio.Task] = {}
+
+    def use_engine(self, engine: lj_engine.LJEngine):
+        """切换到新拟合的引擎，丢弃这些模式下此前缓冲的样本"""
+        self.engine = engine
+        for mode in list(self._samples):
+            if engine.is_fitted(mode):
+                del self._samples[mode]
 
-    current_time = datetime.now()
-    new_sessions = []
+    async def take(self, mode: str, n: int = 2) -> list[dict]:
+        samples = self._samples.setdefault(mode, deque())
+        if self.engine and self.engine.is_fitted(mode):
+            if len(samples) < n:
+                samples.extend(self.engine.sample(mode, max(n, self.engine_batch_size)))
+            return [samples.popleft() for _ in range(n)]
 
-    for session in ljpk_sessions:
-        if (current_time - session.created_at).total_seconds() < expiration_minutes * 60:
-            new_sessions.append(session)
+        if len(samples) >= n:
+            taken = [samples.popleft() for _ in range(n)]
         else:
-            if session.bot_message_id:
-                try:
-                    await bot.delete_msg(message_id=session.bot_message_id)
-                except Exception:
-                    pass  # 无权限或消息已撤回
+            # 缓冲为空时直接拉取
+            taken = await api_get('/casual/lj', {'mode': mode, 'times': n}, coalesce=False)
+        if len(samples) < self.low_water:
+            self._start_refill(mode)
+        return taken
+
+    def _start_refill(self, mode: str):
+        task = self._refills.get(mode)
+        if task is None or task.done():
+            self._refills[mode] = asyncio.create_task(self._refill(mode))
+
+    async def _refill(self, mode: str):
+        try:
+            data = await api_get('/casual/lj', {'mode': mode, 'times': self.batch_size}, timeout=15, coalesce=False)
+        except Exception as e:
+            logger.warning(f"[LJPK] 补充 LJ 样本失败: {e}")
+            return
+        self._samples.setdefault(mode, deque()).extend(data)
+
+
+lj_samples = LJSampleBuffer()
+
+LJ_ENGINE_MODES = ('kzt',)
+
+
+async def fit_lj_engine():
+    """用 jumpstats 与 LJPK 历史拟合本地引擎，失败时继续使用 /casual/lj"""
+    if not axekz_config.lj_engine:
+        return
+
+    engine = lj_engine.LJEngine(seed=axekz_config.lj_engine_seed)
+    for mode in LJ_ENGINE_MODES:
+        try:
+            jumpstats = await api_get('/gokz/jumpstats', {'jump_type': 0, 'mode': mode, 'limit': 5000}, timeout=30)
+            async with new_session() as session:
+                distances = (await session.exec(
+                    select(LJPKRecord.distance1, LJPKRecord.distance2).where(LJPKRecord.mode == mode)
+                )).all()
+            engine.fit(mode, jumpstats, chain.from_iterable(distances))
+        except Exception as e:
+            logger.warning(f"[LJPK] 本地 LJ 引擎拟合 {mode} 失败: {e}")
+    lj_samples.use_engine(engine)
+
+
+nonebot.get_driver().on_startup(fit_lj_engine)
 
-    ljpk_sessions[:] = new_sessions
 
+@scheduler.scheduled_job("cron", hour="4", minute="30", id="fit_lj_engine")
+async def refit_lj_engine():
+    await fit_lj_engine()
 
-# @scheduler.scheduled_job("interval", seconds=5)
-# async def auto_clean_ljpk_sessions(bot: Bot):
-#     bots = get_bots()
-#     if not bots:
-#         return  # No bot connected yet
-#     bot = next(iter(bots.values()))
-#     await clean_expire_session(bot)
+
+def _expire_job_id(group_id: int, message_id: int) -> str:
+    return f"ljpk_expire_{group_id}_{message_id}"
+
+
+async def _expire_session(group_id: int, message_id: int):
+    pk_session = ljpk_sessions.get(group_id, message_id)
+    if not pk_session or not ljpk_sessions.remove(pk_session):
+        return
+
+    bots = get_bots()
+    if not bots:
+        return
+    try:
+        await next(iter(bots.values())).delete_msg(message_id=message_id)
+    except Exception:
+        pass  # 无权限或消息已撤回
+
+
+def close_session(pk_session: LJPKSession) -> bool:
+    """结束对局并取消过期任务，返回是否由本次调用结束"""
+    if not ljpk_sessions.remove(pk_session):
+        return False
+    try:
+        scheduler.remove_job(_expire_job_id(pk_session.group_id, pk_session.bot_message_id))
+    except Exception:
+        pass
+    return True
+
+
+@ljpk_rebuild.handle()
+async def _():
+    processed = await rebuild_ljpk_player_stats()
+    await ljpk_rebuild.finish(f"LJPK 统计重建完成，共处理 {processed} 场对局")
 
 
 @ljpb.handle()
 async def _(event: MessageEvent, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         return await ljpb.send(cd.error, at_sender=True)
 
@@ -136,12 +263,9 @@ async def _(event: MessageEvent, args: Message = CommandArg()):
 
 @ljpk.handle()
 async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
-    # 判定一个人同时只能开一次决斗
-    await clean_expire_session(bot)
-
     reply = MessageSegment.reply(event.message_id)
     user_id = event.get_user_id()
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         return await ljpk.send(reply + cd.error, at_sender=True)
 
@@ -158,10 +282,9 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
             """).strip()
         return await ljpk.send(reply + content, at_sender=True)
 
-    # Check if the player already has an active session
-    for session in ljpk_sessions:
-        if session.user1.qid == cd.user1.qid and session.group_id == event.group_id:
-            return await ljpk.send(reply + "你已经开启了一场决斗，请等待决斗结束后再发起新的决斗。", at_sender=True)
+    # 判定一个人同时只能开一次决斗
+    if ljpk_sessions.get_by_initiator(event.group_id, cd.user1.qid):
+        return await ljpk.send(reply + "你已经开启了一场决斗，请等待决斗结束后再发起新的决斗。", at_sender=True)
 
     if cd.args:
         if cd.args[0] == 'kick':
@@ -198,183 +321,175 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
         自己回复这条消息即取消
     """).strip())
     pk_session.bot_message_id = msg['message_id']
-    ljpk_sessions.append(pk_session)
+    ljpk_sessions.add(pk_session)
+    scheduler.add_job(
+        _expire_session,
+        "date",
+        run_date=pk_session.created_at + timedelta(seconds=SESSION_EXPIRE_SEC),
+        id=_expire_job_id(event.group_id, pk_session.bot_message_id),
+        args=[event.group_id, pk_session.bot_message_id],
+        misfire_grace_time=10,
+        coalesce=True,
+        max_instances=1,
+    )
     return None
 
 
 @accept_game.handle()
-async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep):
-    if event.reply and event.reply.sender.user_id == int(bot.self_id):
-        user_id = event.get_user_id()
-        await clean_expire_session(bot)
-        try:
-            original_message = event.reply.message.extract_plain_text()
-        except TypeError:
-            return None
-
-        match = re.search(r'玩家 (\d+) 开启了一场LJPK', original_message)
-        if not match:
-            return None
-
-        initializer_id = int(match.group(1))
-
-        for pk_session in ljpk_sessions:
-            if int(pk_session.qid1) == initializer_id and pk_session.group_id == event.group_id:
-                if int(pk_session.qid1) == int(user_id):
-                    ljpk_sessions.remove(pk_session)
-                    if pk_session.bot_message_id:
-                        try:
-                            await bot.delete_msg(message_id=pk_session.bot_message_id)
-                        except:
-                            pass
-                    return await accept_game.send('已取消这场比赛', at_sender=True)
-
-                if pk_session.qid2 is not None and int(pk_session.qid2) != int(user_id):
-                    return await accept_game.send('别人跟你PK了吗你就接受', at_sender=True)
-
-                if pk_session.qid2 is None:
-                    pk_session.set_opponent(user_id)
-
-                user1, user2 = pk_session.get_users(session)
-
-                if not user1 or not user2:
-                    return await accept_game.send("玩家数据无效，比赛无法开始", at_sender=True)
-
-                if user1.coins < pk_session.bet_coins:
-                    return await accept_game.send(
-                        f"你的对手 {user1.nickname} 没有足够的硬币:\n需要: {pk_session.bet_coins} 剩余: {user1.coins}", at_sender=True)
-                if user2.coins < pk_session.bet_coins:
-                    return await accept_game.send(
-                        f"你 {user2.nickname} 没有足够的硬币:\n需要: {pk_session.bet_coins} 剩余: {user2.coins}", at_sender=True)
-
-                data: list = await api_get('/casual/lj', {'mode': 'kzt', 'times': 2})
-                random.shuffle(data)
-                data1, data2 = data
-
-                winner, loser = (user1, user2) if data1['distance'] > data2['distance'] else (user2, user1)
-
-                # 免金币场（禁言/踢人）
-                if pk_session.bet_coins <= 0:
-                    ljpk_history = LJPKRecord(
-                        qid1=user1.qid,
-                        qid2=user2.qid,
-                        distance1=data1['distance'],
-                        distance2=data2['distance'],
-                        bet_amount=pk_session.bet_coins,
-                        winner_qid=winner.qid,
-                        mode='kzt'
-                    )
-                    session.add(ljpk_history)
-                    session.commit()
-
-                    content = f'比赛开始！\n'
-                    content += f'昵称 | {user1.nickname:<10} | {user2.nickname}\n'
-                    content += f'距离 | {data1["distance"]} | {data2["distance"]}\n'
-                    content += f'空速 | {data1["max_val"]}      | {data2["max_val"]}\n'
-                    content += f'地速 | {data1["pre"]}       | {data2["pre"]}\n'
-                    content += f'次数 | {data1["strafes"]:<16} | {data2["strafes"]}\n'
-                    content += f'同步 | {data1["sync"]:<11} | {data2["sync"]}\n'
-                    content += f'结果 | {"✅😎获胜" if winner == user1 else "❌😭失败"} | {"✅😎获胜" if winner == user2 else "❌😭失败"}\n'
-
-                    ljpk_sessions.remove(pk_session)
-                    await accept_game.send(content, at_sender=True)
-
-                    if pk_session.bet_coins == 0:
-                        await bot.set_group_kick(group_id=event.group_id, user_id=int(loser.qid))
-                    elif pk_session.bet_coins == -1:
-                        delta_distance = abs(float(data1["distance"]) - float(data2["distance"]))
-                        total_speed_loser = float(data2["max_val"]) + float(data2["pre"])
-                        taunt_messages = [
-                            # 轻度调侃（数据对比）
-                            f"你的同步率{data2['sync']}%是在致敬人类极限吗？我奶奶的缝纫机都比这同步！",
-                            f"空速{data2['max_val']}？建议把键盘泡水里试试，说不定水流能帮你加速",
-                            f"{winner.nickname}的地速{data1['pre']} vs 你的{data2['pre']}，这差距够我泡碗面了",
-                            f"距离差{delta_distance:.1f}单位？刚好是你和人类平均反应速度的差距",
-
-                            # 中度嘲讽（技术羞辱）
-                            "刚才那波操作是闭眼打的？建议改名叫'帕金森流跳远'",
-                            f"看你的{data2['strafes']}次摆速，我以为在欣赏慢动作回放",
-                            "失败结算界面是你第二熟悉的画面吧？",
-                            f"你这{data2['sync']}%的同步率去工地搬砖都怕你手脚不协调砸到脚",
-                            "建议把游戏ID改成'禁言VIP会员'",
-
-                            # 数据暴击（精准打击）
-                            f"空速{data2['max_val']}+地速{data2['pre']}={total_speed_loser:.1f}？二进制选手？",
-                            f"距离{data2['distance']}配{data2['strafes']}次摆速，完美诠释无效操作",
-                            f"你{data2['sync']}%的同步率是想证明左右手互为陌生人？",
-
-                            # 重度暴击（物理禁言梗）
-                            "系统都看不过去帮你物理闭麦了",
-                            "这10分钟禁言是给你时间练习用手走路吗？",
-                            "刚才的跳跃数据是你用脚趾操作的吧？建议嘴也参与操作",
-                            f"别挣扎了，你输掉的{pk_session.bet_coins}金币都够买副哑铃练手速了",
-
-                            # 终极羞辱（结合游戏机制）
-                            f"建议把{data2['distance']}的纪录刻在墓志铭上——这里埋葬着反重力战士",
-                            "你掉落的金币在空中划出的弧线比你跳跃轨迹还优美",
-                            f"系统税收的硬币都比你操作更有价值",
-                            "刚检测到你键盘的WASD键正在发起集体罢工",
-                            "失败者特效在你身上是常驻皮肤吧？"
-                        ]
-                        taunt = random.choice(taunt_messages)  # 省略 taunt_messages，保留原本内容
-                        await accept_game.send(MessageSegment.at(int(loser.qid)) + " " + taunt, at_sender=True)
-                        await bot.set_group_ban(group_id=event.group_id, user_id=int(loser.qid), duration=24 * 60 * 60)
-                    return None
-
-                tax = math.ceil(pk_session.bet_coins * 0.20)
-                winner_gain = pk_session.bet_coins - tax
-                winner.coins += winner_gain
-                loser.coins -= pk_session.bet_coins
-                bank = get_bank()
-                bank.coins += tax
-
-                session.add_all([
-                    CoinTransaction(
-                        user_id=loser.qid,
-                        amount=-pk_session.bet_coins,
-                        type=TransactionType.LJPK,
-                        description=f"LJPK 输给 {winner.nickname}，扣除 {pk_session.bet_coins}"
-                    ),
-                    CoinTransaction(
-                        user_id=winner.qid,
-                        amount=winner_gain,
-                        type=TransactionType.LJPK,
-                        description=f"LJPK 战胜 {loser.nickname}，获得 {winner_gain}（税后）"
-                    ),
-                    CoinTransaction(
-                        user_id="bank",
-                        amount=tax,
-                        type=TransactionType.LJPK,
-                        description=f"LJPK 税收来自 {loser.nickname}"
-                    )
-                ])
-
-                ljpk_history = LJPKRecord(
-                    qid1=user1.qid,
-                    qid2=user2.qid,
-                    distance1=data1['distance'],
-                    distance2=data2['distance'],
-                    bet_amount=pk_session.bet_coins,
-                    winner_qid=winner.qid,
-                    mode='kzt'
-                )
-
-                session.add_all([winner, loser, bank, ljpk_history])
-                session.commit()
-
-                content = f'比赛开始！ 投入: {pk_session.bet_coins} 硬币\n'
-                content += f'昵称 | {user1.nickname:<10} | {user2.nickname}\n'
-                content += f'距离 | {data1["distance"]} | {data2["distance"]}\n'
-                content += f'空速 | {data1["max_val"]}      | {data2["max_val"]}\n'
-                content += f'地速 | {data1["pre"]}       | {data2["pre"]}\n'
-                content += f'次数 | {data1["strafes"]:<16} | {data2["strafes"]}\n'
-                content += f'同步 | {data1["sync"]:<11} | {data2["sync"]}\n'
-                content += f'结果 | {"✅😎获胜" if winner == user1 else "❌😭失败"} | {"✅😎获胜" if winner == user2 else "❌😭失败"}\n'
-                content += f'余额 | {user1.coins:,} ({f"+{winner_gain}" if winner == user1 else f"-{pk_session.bet_coins}"}) | {user2.coins:,} ({f"+{winner_gain}" if winner == user2 else f"-{pk_session.bet_coins}"})\n'
-                content += f'税收 | {tax} 硬币\n'
-
-                ljpk_sessions.remove(pk_session)
-                return await accept_game.send(content, at_sender=True)
+async def _(bot: Bot, event: GroupMessageEvent, session: AsyncSessionDep):
+    user_id = event.get_user_id()
 
+    pk_session = ljpk_sessions.get(event.group_id, int(event.reply.message_id))
+    if pk_session is None:
         return await accept_game.send("未找到该LJPK对局，或已被其他玩家接受，或已超过两分钟", at_sender=True)
-    return None
+
+    if int(pk_session.qid1) == int(user_id):
+        if not close_session(pk_session):
+            return None
+        try:
+            await bot.delete_msg(message_id=pk_session.bot_message_id)
+        except:
+            pass
+        return await accept_game.send('已取消这场比赛', at_sender=True)
+
+    if pk_session.qid2 is not None and int(pk_session.qid2) != int(user_id):
+        return await accept_game.send('别人跟你PK了吗你就接受', at_sender=True)
+
+    if pk_session.qid2 is None:
+        pk_session.set_opponent(user_id)
+
+    user1, user2 = await pk_session.get_users(session)
+
+    if not user1 or not user2:
+        return await accept_game.send("玩家数据无效，比赛无法开始", at_sender=True)
+
+    if user1.coins < pk_session.bet_coins:
+        return await accept_game.send(
+            f"你的对手 {user1.nickname} 没有足够的硬币:\n需要: {pk_session.bet_coins} 剩余: {user1.coins}", at_sender=True)
+    if user2.coins < pk_session.bet_coins:
+        return await accept_game.send(
+            f"你 {user2.nickname} 没有足够的硬币:\n需要: {pk_session.bet_coins} 剩余: {user2.coins}", at_sender=True)
+
+    # 取样失败时保留对局，玩家可以再次回复接受
+    try:
+        data: list = await lj_samples.take('kzt')
+    except Exception as e:
+        logger.warning(f"[LJPK] 获取 LJ 样本失败: {e}")
+        return await accept_game.send("获取跳跃数据失败，比赛未能开始，请稍后再次回复接受", at_sender=True)
+
+    # 结束对局后再结算，避免并发的两次回复重复结算
+    if not close_session(pk_session):
+        return None
+
+    random.shuffle(data)
+    data1, data2 = data
+
+    winner, loser = (user1, user2) if data1['distance'] > data2['distance'] else (user2, user1)
+
+    # 免金币场（禁言/踢人）
+    if pk_session.bet_coins <= 0:
+        ljpk_history = LJPKRecord(
+            qid1=user1.qid,
+            qid2=user2.qid,
+            distance1=data1['distance'],
+            distance2=data2['distance'],
+            bet_amount=pk_session.bet_coins,
+            winner_qid=winner.qid,
+            mode='kzt'
+        )
+        await record_ljpk_match(session, ljpk_history)
+        await session.commit()
+
+        content = f'比赛开始！\n'
+        content += f'昵称 | {user1.nickname:<10} | {user2.nickname}\n'
+        content += f'距离 | {data1["distance"]} | {data2["distance"]}\n'
+        content += f'空速 | {data1["max_val"]}      | {data2["max_val"]}\n'
+        content += f'地速 | {data1["pre"]}       | {data2["pre"]}\n'
+        content += f'次数 | {data1["strafes"]:<16} | {data2["strafes"]}\n'
+        content += f'同步 | {data1["sync"]:<11} | {data2["sync"]}\n'
+        content += f'结果 | {"✅😎获胜" if winner == user1 else "❌😭失败"} | {"✅😎获胜" if winner == user2 else "❌😭失败"}\n'
+
+        await accept_game.send(content, at_sender=True)
+
+        if pk_session.bet_coins == 0:
+            await bot.set_group_kick(group_id=event.group_id, user_id=int(loser.qid))
+        elif pk_session.bet_coins == -1:
+            delta_distance = abs(float(data1["distance"]) - float(data2["distance"]))
+            total_speed_loser = float(data2["max_val"]) + float(data2["pre"])
+            taunt_messages = [
+                # 轻度调侃（数据对比）
+                f"你的同步率{data2['sync']}%是在致敬人类极限吗？我奶奶的缝纫机都比这同步！",
+                f"空速{data2['max_val']}？建议把键盘泡水里试试，说不定水流能帮你加速",
+                f"{winner.nickname}的地速{data1['pre']} vs 你的{data2['pre']}，这差距够我泡碗面了",
+                f"距离差{delta_distance:.1f}单位？刚好是你和人类平均反应速度的差距",
+
+                # 中度嘲讽（技术羞辱）
+                "刚才那波操作是闭眼打的？建议改名叫'帕金森流跳远'",
+                f"看你的{data2['strafes']}次摆速，我以为在欣赏慢动作回放",
+                "失败结算界面是你第二熟悉的画面吧？",
+                f"你这{data2['sync']}%的同步率去工地搬砖都怕你手脚不协调砸到脚",
+                "建议把游戏ID改成'禁言VIP会员'",
+
+                # 数据暴击（精准打击）
+                f"空速{data2['max_val']}+地速{data2['pre']}={total_speed_loser:.1f}？二进制选手？",
+                f"距离{data2['distance']}配{data2['strafes']}次摆速，完美诠释无效操作",
+                f"你{data2['sync']}%的同步率是想证明左右手互为陌生人？",
+
+                # 重度暴击（物理禁言梗）
+                "系统都看不过去帮你物理闭麦了",
+                "这10分钟禁言是给你时间练习用手走路吗？",
+                "刚才的跳跃数据是你用脚趾操作的吧？建议嘴也参与操作",
+                f"别挣扎了，你输掉的{pk_session.bet_coins}金币都够买副哑铃练手速了",
+
+                # 终极羞辱（结合游戏机制）
+                f"建议把{data2['distance']}的纪录刻在墓志铭上——这里埋葬着反重力战士",
+                "你掉落的金币在空中划出的弧线比你跳跃轨迹还优美",
+                f"系统税收的硬币都比你操作更有价值",
+                "刚检测到你键盘的WASD键正在发起集体罢工",
+                "失败者特效在你身上是常驻皮肤吧？"
+            ]
+            taunt = random.choice(taunt_messages)  # 省略 taunt_messages，保留原本内容
+            await accept_game.send(MessageSegment.at(int(loser.qid)) + " " + taunt, at_sender=True)
+            await bot.set_group_ban(group_id=event.group_id, user_id=int(loser.qid), duration=24 * 60 * 60)
+        return None
+
+    tax = math.ceil(pk_session.bet_coins * 0.20)
+    winner_gain = pk_session.bet_coins - tax
+    try:
+        result = await ledger.transfer(
+            session, loser.qid, winner.qid, pk_session.bet_coins,
+            tax=tax,
+            type=TransactionType.LJPK,
+            description=f"LJPK 输给 {winner.nickname}，扣除 {pk_session.bet_coins}",
+            to_description=f"LJPK 战胜 {loser.nickname}，获得 {winner_gain}（税后）",
+            tax_description=f"LJPK 税收来自 {loser.nickname}",
+        )
+    except InsufficientCoins:
+        return await accept_game.send(f"{loser.nickname} 的硬币不足以支付赌注，比赛作废", at_sender=True)
+    balances = {winner.qid: result.to_balance, loser.qid: result.from_balance}
+
+    ljpk_history = LJPKRecord(
+        qid1=user1.qid,
+        qid2=user2.qid,
+        distance1=data1['distance'],
+        distance2=data2['distance'],
+        bet_amount=pk_session.bet_coins,
+        winner_qid=winner.qid,
+        mode='kzt'
+    )
+
+    await record_ljpk_match(session, ljpk_history)
+    await session.commit()
+
+    content = f'比赛开始！ 投入: {pk_session.bet_coins} 硬币\n'
+    content += f'昵称 | {user1.nickname:<10} | {user2.nickname}\n'
+    content += f'距离 | {data1["distance"]} | {data2["distance"]}\n'
+    content += f'空速 | {data1["max_val"]}      | {data2["max_val"]}\n'
+    content += f'地速 | {data1["pre"]}       | {data2["pre"]}\n'
+    content += f'次数 | {data1["strafes"]:<16} | {data2["strafes"]}\n'
+    content += f'同步 | {data1["sync"]:<11} | {data2["sync"]}\n'
+    content += f'结果 | {"✅😎获胜" if winner == user1 else "❌😭失败"} | {"✅😎获胜" if winner == user2 else "❌😭失败"}\n'
+    content += f'余额 | {balances[user1.qid]:,} ({f"+{winner_gain}" if winner == user1 else f"-{pk_session.bet_coins}"}) | {balances[user2.qid]:,} ({f"+{winner_gain}" if winner == user2 else f"-{pk_session.bet_coins}"})\n'
+    content += f'税收 | {tax} 硬币\n'
+
+    return await accept_game.send(content, at_sender=True)
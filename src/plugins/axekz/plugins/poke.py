@@ -7,7 +7,7 @@ from nonebot.rule import to_me
 from nonebot_plugin_capoo import pic
 
 from .lee_god import random_lee_word
-from ..core.db.deps import SessionDep
+from ..core.db.deps import AsyncSessionDep
 from ..core.db.models import User
 from ..core.utils.helpers import api_get
 
@@ -26,16 +26,16 @@ group_poke = on_type(
 
 
 @group_poke.handle()
-async def _(event: PokeNotifyEvent, session: SessionDep):
+async def _(event: PokeNotifyEvent, session: AsyncSessionDep):
     num = random.random()
     if num < 0.95:
         return
 
-    user: User | None = session.get(User, event.user_id)
+    user: User | None = await session.get(User, event.user_id)
     if not user:
         return
 
-    target_user: User | None = session.get(User, event.target_id)
+    target_user: User | None = await session.get(User, event.target_id)
     if not target_user:
         return
 
@@ -52,14 +52,14 @@ async def _(event: PokeNotifyEvent, session: SessionDep):
 
 
 @poke_me.handle()
-async def _(event: PokeNotifyEvent, session: SessionDep):
-    user: User | None = session.get(User, event.user_id)
+async def _(event: PokeNotifyEvent, session: AsyncSessionDep):
+    user: User | None = await session.get(User, event.user_id)
     if not user:
         return
 
     num = random.random()
     if num > 0.7:
-        return await poke_me.send(random_lee_word())
+        return await poke_me.send(await random_lee_word())
     if num > 0.4:
         return await pic()
 
@@ -3,8 +3,10 @@ from nonebot.adapters.onebot.v11 import GroupMessageEvent, MessageSegment, Messa
 from nonebot.params import CommandArg
 from nonebot.permission import SUPERUSER
 
-from src.plugins.axekz.core import get_bank
-from src.plugins.axekz.core.db.deps import SessionDep
+from src.plugins.axekz.core import BANK_QID, ledger
+from src.plugins.axekz.core.db.deps import AsyncSessionDep
+from src.plugins.axekz.core.db.models import TransactionType
+from src.plugins.axekz.core.ledger import InsufficientCoins
 from src.plugins.axekz.core.utils.command_helper import CommandData
 
 mute = on_command('mute', aliases={'禁言'})
@@ -17,16 +19,16 @@ KICK_COST = 1000
 
 
 @kick.handle()
-async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(bot: Bot, event: GroupMessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     bot_info = await bot.get_group_member_info(user_id=int(bot.self_id), group_id=event.group_id, no_cache=False)
     if bot_info['role'] == 'member':
-        return await admin.send('机器人在本群不是管理员，无法踢出')
+        return await kick.send('机器人在本群不是管理员，无法踢出')
 
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
-        return await mute.send(cd.error, at_sender=True)
+        return await kick.send(cd.error, at_sender=True)
     if not cd.user2:
-        return await mute.send("未指定成员", at_sender=True)
+        return await kick.send("未指定成员", at_sender=True)
 
     # 判定余额是否充足
     target_user_info = await bot.get_group_member_info(user_id=int(cd.user2.qid), group_id=event.group_id, no_cache=False)
@@ -36,32 +38,31 @@ async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep, args: Messa
         cost = KICK_COST
 
     if cd.user1.coins < cost:
-        return await mute.finish(f'没有足够的斧币，需要: {cost}, 你有 {cd.user1.coins}', at_sender=True)
-
-    cd.user1.coins -= cost
-
-    bank = get_bank()
-    bank.coins += cost
-
-    session.add(cd.user1)
-    session.add(bank)
-    session.commit()
-    session.refresh(cd.user1)
-    session.refresh(bank)
+        return await kick.finish(f'没有足够的斧币，需要: {cost}, 你有 {cd.user1.coins}', at_sender=True)
+
+    try:
+        result = await ledger.transfer(
+            session, cd.user1.qid, BANK_QID, cost,
+            type=TransactionType.PURCHASE,
+            description=f"踢出 {cd.user2.nickname}",
+        )
+    except InsufficientCoins:
+        return await kick.finish(f'没有足够的斧币，需要: {cost}', at_sender=True)
+    await session.commit()
 
     await bot.set_group_kick(group_id=event.group_id, user_id=int(cd.user2.qid))
-    await kick.send(f'踢出 {cd.user2.nickname} 成功，余额 {cd.user1.coins}', at_sender=True)
+    await kick.send(f'踢出 {cd.user2.nickname} 成功，余额 {result.from_balance}', at_sender=True)
     return None
 
 
 @mute.handle()
-async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(bot: Bot, event: GroupMessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     bot_info = await bot.get_group_member_info(user_id=int(bot.self_id), group_id=event.group_id, no_cache=False)
     if bot_info['role'] != 'admin':
         return await admin.send('机器人在本群不是管理员，无法禁言')
 
     reply = MessageSegment.reply(event.message_id)
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         return await mute.send(reply + cd.error)
     if not cd.user2:
@@ -84,16 +85,18 @@ async def _(bot: Bot, event: GroupMessageEvent, session: SessionDep, args: Messa
     if cd.user1.coins < cost:
         return await mute.finish(f'没有足够的斧币，需要: {cost}, 你有 {cd.user1.coins}', at_sender=True)
 
-    bank = get_bank()
-    cd.user1.coins -= cost
-    bank.coins += cost
-    session.add(cd.user1)
-    session.add(bank)
-    session.commit()
-    session.refresh(cd.user1)
+    try:
+        result = await ledger.transfer(
+            session, cd.user1.qid, BANK_QID, cost,
+            type=TransactionType.PURCHASE,
+            description=f"禁言 {cd.user2.nickname} {ban_seconds} 秒",
+        )
+    except InsufficientCoins:
+        return await mute.finish(f'没有足够的斧币，需要: {cost}', at_sender=True)
+    await session.commit()
 
     await bot.set_group_ban(group_id=event.group_id, user_id=int(cd.user2.qid), duration=ban_seconds)
-    await mute.finish(f'禁言成功，花费 {cost}, 剩余 {cd.user1.coins}', at_sender=True)
+    await mute.finish(f'禁言成功，花费 {cost}, 剩余 {result.from_balance}', at_sender=True)
 
 
 @group_rename.handle()
@@ -103,13 +106,13 @@ async def _(bot: Bot, event: GroupMessageEvent, args: Message = CommandArg()):
 
 
 @admin.handle()
-async def _(bot: Bot, event: MessageEvent, session: SessionDep, args: Message = CommandArg()):
+async def _(bot: Bot, event: MessageEvent, session: AsyncSessionDep, args: Message = CommandArg()):
     # bot_info = await bot.get_group_member_info(user_id=int(bot.self_id), group_id=event.group_id, no_cache=True)
     # if bot_info['role'] != 'owner':
     #     return await admin.send('机器人在本群不是群主，无法购买管理员')
     group_id = 188099455
 
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         return await mute.send(cd.error, at_sender=True)
     if cd.user1.qid == '986668919':
@@ -1,60 +1,69 @@
 import random
 from datetime import datetime, timedelta
-from math import ceil
 from textwrap import dedent
+from time import perf_counter
 
 from nonebot import get_bot, logger
 from nonebot.adapters.onebot.v11 import Bot, MessageSegment
 from nonebot_plugin_apscheduler import scheduler
-from sqlmodel import Session, select
+from sqlmodel import select, update, insert, func, literal
 
 from .. import axekz_config
-from ..core import get_bank, BANK_QID
-from ..core.db import engine
+from ..core import BANK_QID, capitalists, ledger
+from ..core.db.deps import new_session
 from ..core.db.models import Sign, User, Roll, TransactionType, CoinTransaction
 
 
-async def daily_asset_tax():
+async def daily_asset_tax() -> tuple[int, int]:
+    """按 ceil(coins / 1000) 扣除资产税，全部在数据库端一次完成，返回 (扣税人数, 税收总额)"""
     logger.info("开始每日资产税收...")
-
-    with Session(engine) as session:
-        users = session.exec(select(User).where(User.qid != BANK_QID)).all()
-        tax_records = []
-        total_tax = 0
-
-        for user in users:
-            if user.coins < 1:
-                continue
-
-            tax_amount = ceil(user.coins / 1000)
-            total_tax += tax_amount
-
-            user.coins -= tax_amount
-            tax_records.append(CoinTransaction(
-                user_id=user.qid,
-                amount=-tax_amount,
-                type=TransactionType.TAX,
-                description=f"每日资产税收: {tax_amount}"
-            ))
-            session.add(user)
-
-        if total_tax > 0:
-            bank = get_bank()
-            bank.coins += total_tax
-            session.add(bank)
-
-            tax_records.append(CoinTransaction(
-                user_id="bank",
-                amount=total_tax,
-                type=TransactionType.TAX,
-                description=f"每日资产税收汇总收入，共 {total_tax} 硬币"
-            ))
-
-            session.add_all(tax_records)
-            session.commit()
-            logger.info(f"已成功扣除资产税，处理 {len(tax_records) - 1} 位用户，税收共计 {total_tax}")
-        else:
+    started = perf_counter()
+
+    tax_amount = func.ceil(User.coins / 1000)
+    taxable = (User.qid != BANK_QID, User.coins >= 1)
+
+    async with new_session() as session:
+        # 先锁住所有应税用户，保证后面的账单与扣款基于同一份余额
+        users, total_tax = (await session.exec(
+            select(func.count(), func.coalesce(func.sum(tax_amount), 0)).where(*taxable).with_for_update()
+        )).one()
+        total_tax = int(total_tax)
+        if not users:
             logger.info("无可扣税用户，无操作")
+            return 0, 0
+
+        await session.exec(
+            insert(CoinTransaction).from_select(
+                ['user_id', 'amount', 'type', 'description', 'created_at'],
+                select(
+                    User.qid,
+                    -tax_amount,
+                    literal(TransactionType.TAX, CoinTransaction.__table__.c.type.type),
+                    func.concat("每日资产税收: ", tax_amount),
+                    func.now(),
+                ).where(*taxable),
+            )
+        )
+        result = await session.exec(
+            update(User).where(*taxable).values(coins=User.coins - tax_amount)
+            .execution_options(synchronize_session=False)
+        )
+        capitalists.mark_stale(session)
+
+        await ledger.credit_bank(session, total_tax)
+        session.add(CoinTransaction(
+            user_id=ledger.BANK_LEDGER_ID,
+            amount=total_tax,
+            type=TransactionType.TAX,
+            description=f"每日资产税收汇总收入，共 {total_tax} 硬币"
+        ))
+        await session.commit()
+
+    logger.info(
+        f"已成功扣除资产税，处理 {result.rowcount} 位用户，税收共计 {total_tax}，"
+        f"耗时 {perf_counter() - started:.2f}s"
+    )
+    return result.rowcount, total_tax
 
 
 @scheduler.scheduled_job("cron", hour="1", minute="0", id="daily_tax")
@@ -69,12 +78,12 @@ async def daily_roll():
     start_of_yesterday = datetime(yesterday.year, yesterday.month, yesterday.day)
     end_of_yesterday = start_of_yesterday + timedelta(days=1)
 
-    with Session(engine) as session:
+    async with new_session() as session:
         statement = select(Sign).where(
             Sign.signed_at >= start_of_yesterday,
             Sign.signed_at < end_of_yesterday
         )
-        results = session.exec(statement).all()
+        results = (await session.exec(statement)).all()
 
         if not results:
             return
@@ -84,11 +93,14 @@ async def daily_roll():
         prize = int((total_coins ** 0.5) * 10)
 
         winner_sign = random.choice(results)
-        winner: User | None = session.get(User, winner_sign.qid)
+        winner: User | None = await session.get(User, winner_sign.qid)
 
         if winner:
-            winner.coins += int(prize)
-            session.add(winner)
+            await ledger.transfer(
+                session, None, winner.qid, int(prize),
+                type=TransactionType.SIGN,
+                description=f"每日抽奖奖励（{signers} 人参与）",
+            )
 
             roll = Roll(
                 signers=signers,
@@ -96,7 +108,7 @@ async def daily_roll():
                 winner_qid=winner.qid
             )
             session.add(roll)
-            session.commit()
+            await session.commit()
 
         content = dedent(f"""
                 ╔═══每日抽奖═══╗
@@ -1,12 +1,29 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
 from nonebot import logger, get_bots, get_bot
 from nonebot.plugin import on_command
 from nonebot_plugin_apscheduler import scheduler
 
 from .. import API_BASE
-from ..core.dataclasses.servers import ServersInfo
+from ..core.dataclasses.servers import ServersBrief, parse_servers_info
 from ..core.utils.helpers import aio_get
 
 GROUP_ID = 188099455
+POLL_INTERVAL = 60  # 秒，与原先更新群名片的任务相同
+
+
+@dataclass
+class ServersSnapshot:
+    info: ServersBrief
+    version: int
+    fetched_at: datetime
+
+
+_snapshot: ServersSnapshot | None = None
+# 按 (快照版本, show_empty) 缓存渲染好的文本
+_rendered: dict[tuple[int, bool], str] = {}
+_card_total: int | None = None
 
 serv = on_command("服务器", aliases={"s"}, priority=10, block=True)
 list_ = on_command("ls", aliases={"list"}, priority=10, block=True)
@@ -38,11 +55,31 @@ async def handle_list_function():
     return await list_.finish(content)
 
 
+async def refresh_servers_snapshot() -> ServersSnapshot:
+    global _snapshot
+    data = await aio_get(f"{API_BASE}/servers/", timeout=15)
+    version = _snapshot.version + 1 if _snapshot else 1
+    _snapshot = ServersSnapshot(info=parse_servers_info(data), version=version, fetched_at=datetime.now())
+    _rendered.clear()
+    return _snapshot
+
+
+async def get_servers_snapshot() -> ServersSnapshot:
+    """读取轮询得到的最新快照；尚无快照或轮询中断过久时当场拉取"""
+    if _snapshot is None or datetime.now() - _snapshot.fetched_at > timedelta(seconds=POLL_INTERVAL * 3):
+        return await refresh_servers_snapshot()
+    return _snapshot
+
+
 async def fetch_and_format_servers_info(show_empty=False):
-    url = f"{API_BASE}/servers/"
-    data = await aio_get(url)
-    servers_info = ServersInfo(servers=data)
+    snapshot = await get_servers_snapshot()
+    key = (snapshot.version, show_empty)
+    if key not in _rendered:
+        _rendered[key] = format_servers_info(snapshot.info, show_empty)
+    return _rendered[key]
+
 
+def format_servers_info(servers_info: ServersBrief, show_empty=False) -> str:
     content = ""
     for s in servers_info.servers:
         # 检查服务器是否查询失败
@@ -66,29 +103,30 @@ async def fetch_and_format_servers_info(show_empty=False):
     return content
 
 
-async def get_total_online_players() -> int:
+@scheduler.scheduled_job("interval", seconds=POLL_INTERVAL, id="poll_servers")
+async def poll_servers():
     try:
-        url = f"{API_BASE}/servers/"
-        data = await aio_get(url, timeout=15)
-        servers_info = ServersInfo(servers=data)
-        return sum((s.player_count for s in servers_info.servers if s is not None), 0)
+        snapshot = await refresh_servers_snapshot()
     except Exception as e:
-        logger.warning(f"[GroupNameUpdater] Failed to fetch servers: {e}")
-        return 0
+        logger.warning(f"[ServersPoller] Failed to fetch servers: {e}")
+        return
+    total = sum((s.player_count for s in snapshot.info.servers if s is not None), 0)
+    await update_group_card(total)
 
 
-@scheduler.scheduled_job("interval", minutes=1, id="update_group_name_every_minute")
-async def update_group_name_every_minute():
-    bot = get_bot()
-    if not bot:
+async def update_group_card(total: int):
+    """在线人数变化时才更新群名片"""
+    global _card_total
+    if total == _card_total or not get_bots():
         return
 
-    total = await get_total_online_players()
+    bot = get_bot()
     new_card = f"千早爱音 {total}"
 
     try:
         # Use the OB11 adapter method (wraps set_group_card)
         await bot.set_group_card(group_id=GROUP_ID, user_id=bot.self_id, card=new_card)
+        _card_total = total
         logger.debug(f"[GroupCardUpdater] Group card set to: {new_card}")
     except Exception as e:
         logger.warning(f"[GroupCardUpdater] Failed to set group card: {e}")
@@ -6,7 +6,7 @@ from nonebot.plugin import on_command
 from .general import bind_steamid
 from .. import axekz_config
 from ..core.db.models import User
-from ..core.db.deps import SessionDep
+from ..core.db.deps import AsyncSessionDep
 from ..core.utils.convertors import convert_steamid
 from ..core.utils.helpers import api_get, aio_get, api_post
 
@@ -36,10 +36,10 @@ async def _(event: MessageEvent, args: Message = CommandArg()):
 
 
 @wl.handle()
-async def _(event: MessageEvent, session: SessionDep):
+async def _(event: MessageEvent, session: AsyncSessionDep):
     # await wl.finish('该功能已停用')
     user_id = event.get_user_id()
-    user: User | None = session.get(User, user_id)
+    user: User | None = await session.get(User, user_id)
     if not user:
         user = await bind_steamid(event, session)
 
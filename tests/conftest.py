@@ -0,0 +1,41 @@
+"""测试环境：以 none 驱动初始化 NoneBot 并加载 axekz，数据库换成内存 SQLite"""
+import asyncio
+
+import nonebot
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+nonebot.init(
+    driver="~none",
+    db_host="localhost", db_port=3306, db_user="test", db_password="test", db_name="test", token="test",
+)
+nonebot.load_plugin("nonebot_plugin_apscheduler")
+nonebot.load_plugin("src.plugins.axekz")
+
+from src.plugins.axekz.core.db import deps  # noqa: E402
+
+
+def _register_functions(dbapi_connection, connection_record):
+    # MySQL 内置而 SQLite 没有的函数
+    dbapi_connection.create_function("concat", -1, lambda *args: "".join(str(arg) for arg in args))
+
+
+@pytest.fixture
+def run_db(monkeypatch):
+    """run_db(main) 在新建好表的内存数据库上运行协程函数 main"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    event.listen(engine.sync_engine, "connect", _register_functions)
+    monkeypatch.setattr(deps, "engine", engine)
+
+    async def run(main):
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        try:
+            return await main()
+        finally:
+            await engine.dispose()
+
+    return lambda main: asyncio.run(run(main))
@@ -0,0 +1,137 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import mysql
+from sqlmodel import select, insert, func, literal
+
+from src.plugins.axekz.core import betting
+from src.plugins.axekz.core.db.deps import new_session
+from src.plugins.axekz.core.db.models import User, BetEvent, BetOption, BetRecord, CoinTransaction, TransactionType
+
+OPTIONS = 5
+WINNER = 2
+
+
+def legacy_payouts(bets: dict[tuple[str, int], int], option_id: int) -> dict[str, int]:
+    """原 /checkout 的逐条结算：每条获胜投注入账 int(投注额 * 浮点赔率)"""
+    total_bets = sum(bets.values())
+    winning_bets = sum(amount for (_, option), amount in bets.items() if option == option_id)
+    odds = total_bets / winning_bets
+    payouts = {}
+    for (qid, option), amount in bets.items():
+        if option == option_id:
+            payouts[qid] = payouts.get(qid, 0) + int(amount * odds)
+    return payouts
+
+
+async def seed(bets: dict[tuple[str, int], int]):
+    qids = sorted({qid for qid, _ in bets})
+    async with new_session() as session:
+        await session.exec(insert(User).values([
+            dict(qid=qid, steamid=f's{qid}', nickname=f'user{qid}', coins=0) for qid in qids
+        ]))
+        session.add(BetEvent(id=1, name='test', end_time=datetime.now() + timedelta(days=1)))
+        await session.exec(insert(BetOption).values([
+            dict(option_id=o, event_id=1, option_name=f'option{o}', qid=str(o), steamid='s', is_cancelled=False)
+            for o in range(1, OPTIONS + 1)
+        ]))
+        await session.exec(insert(BetRecord).values([
+            dict(user_id=qid, event_id=1, option_id=option_id, bet_amount=amount)
+            for (qid, option_id), amount in bets.items()
+        ]))
+        await session.commit()
+
+
+async def balances() -> dict[str, int]:
+    async with new_session() as session:
+        return dict((await session.exec(select(User.qid, User.coins).where(User.coins != 0))).all())
+
+
+async def rewards() -> dict[str, int]:
+    async with new_session() as session:
+        return dict((await session.exec(
+            select(CoinTransaction.user_id, CoinTransaction.amount)
+            .where(CoinTransaction.type == TransactionType.BET_REWARD)
+        )).all())
+
+
+def random_bets(rng, users: int = 200) -> dict[tuple[str, int], int]:
+    bets = {}
+    for _ in range(600):
+        bets[(str(rng.randrange(users)), rng.randint(1, OPTIONS))] = rng.randint(1, 1000)
+    return bets
+
+
+def test_settle_twice_credits_once(run_db):
+    bets = random_bets(random.Random(0))
+
+    async def main():
+        await seed(bets)
+        async with new_session() as session:
+            settlement = await betting.settle_event(session, 1, WINNER)
+            await session.commit()
+        credited = await balances()
+        assert credited == await rewards()
+        assert credited == {line.qid: line.payout for line in settlement.lines if line.payout}
+
+        async with new_session() as session:
+            with pytest.raises(betting.EventAlreadySettled):
+                await betting.settle_event(session, 1, WINNER)
+            await session.commit()
+        async with new_session() as session:
+            with pytest.raises(betting.EventAlreadySettled):
+                await betting.settle_event(session, 1, WINNER + 1)
+            await session.commit()
+
+        assert await balances() == credited
+        assert await rewards() == credited
+        async with new_session() as session:
+            assert (await session.get(BetEvent, 1)).result_option_id == WINNER
+
+    run_db(main)
+
+
+def test_payout_rounding_matches_legacy_loop(run_db):
+    bets = random_bets(random.Random(1))
+
+    async def main():
+        await seed(bets)
+        async with new_session() as session:
+            settlement = await betting.settle_event(session, 1, WINNER)
+            await session.commit()
+
+        total_bets = sum(bets.values())
+        winning_bets = sum(amount for (_, option), amount in bets.items() if option == WINNER)
+        assert (settlement.total_bets, settlement.winning_bets) == (total_bets, winning_bets)
+
+        exact = {qid: amount * total_bets // winning_bets for (qid, option), amount in bets.items() if option == WINNER}
+        legacy = legacy_payouts(bets, WINNER)
+        credited = await balances()
+        assert credited == {qid: payout for qid, payout in exact.items() if payout}
+        # 浮点赔率只会让原逻辑向下少算，且每条投注最多差 1
+        for qid, payout in legacy.items():
+            assert exact[qid] - 1 <= payout <= exact[qid]
+
+    run_db(main)
+
+
+def test_payout_is_exact_where_float_odds_round_down(run_db):
+    # 391 * (399 / 391) == 398.999…，原逻辑只入账 398
+    bets = {('1', WINNER): 391, ('2', WINNER + 1): 8}
+    assert legacy_payouts(bets, WINNER) == {'1': 398}
+
+    async def main():
+        await seed(bets)
+        async with new_session() as session:
+            await betting.settle_event(session, 1, WINNER)
+            await session.commit()
+        assert await balances() == {'1': 399}
+
+    run_db(main)
+
+
+def test_int_div_compiles_to_mysql_div():
+    expression = betting._int_div(func.sum(BetRecord.bet_amount) * literal(399), literal(391))
+    sql = str(select(expression).compile(dialect=mysql.dialect(), compile_kwargs={'literal_binds': True}))
+    assert '((sum(bet_records.bet_amount) * 399) DIV (391))' in sql
@@ -0,0 +1,112 @@
+import random
+
+from sqlmodel import select, insert, update
+
+from src.plugins.axekz.core import BANK_QID, capitalists, ledger
+from src.plugins.axekz.core.capitalists import MIN_COINS, TopCoins
+from src.plugins.axekz.core.db.deps import new_session
+from src.plugins.axekz.core.db.models import User, BankShard, TransactionType
+
+USERS = 60
+
+
+async def sql_top(session, k):
+    return list((await session.exec(
+        select(User.qid)
+        .where(User.qid != BANK_QID, User.coins >= MIN_COINS)
+        .order_by(User.coins.desc())
+        .limit(k)
+    )).all())
+
+
+async def seed_users(rng) -> dict[str, int]:
+    # 余额互不相同，避免并列时排序不确定
+    coins = dict(zip(map(str, range(USERS)), rng.sample(range(0, 3000), USERS)))
+    async with new_session() as session:
+        session.add(User(qid=BANK_QID, steamid='bank', coins=10 ** 9))
+        session.add_all([BankShard(shard=i) for i in range(16)])
+        await session.exec(insert(User).values([dict(qid=q, steamid=f's{q}', coins=c) for q, c in coins.items()]))
+        await session.commit()
+    return coins
+
+
+def test_top_coins_matches_order_by_after_updates_and_evictions(run_db, monkeypatch):
+    rng = random.Random(0)
+    trims = 0
+    trim = TopCoins._trim
+
+    def counting_trim(self):
+        nonlocal trims
+        trims += 1
+        trim(self)
+
+    monkeypatch.setattr(TopCoins, '_trim', counting_trim)
+
+    async def main():
+        coins = await seed_users(rng)
+        used = set(coins.values())
+        reloads = 0
+
+        async def load():
+            nonlocal reloads
+            reloads += 1
+            async with new_session() as session:
+                rows = (await session.exec(
+                    select(User.qid, User.coins)
+                    .where(User.qid != BANK_QID, User.coins >= MIN_COINS)
+                    .order_by(User.coins.desc())
+                    .limit(4)
+                )).all()
+            return TopCoins(rows, size=4)
+
+        top = await load()
+        for _ in range(800):
+            qid = str(rng.randrange(USERS))
+            value = rng.choice([rng.randrange(0, MIN_COINS), rng.randrange(MIN_COINS, 6000)])
+            while value in used:
+                value += 1
+            used.add(value)
+            async with new_session() as session:
+                await session.exec(update(User).where(User.qid == qid).values(coins=value))
+                await session.commit()
+            top.update(qid, value)
+
+            for k in (1, 3):
+                result = top.top(k)
+                if result is None:
+                    top = await load()
+                    result = top.top(k)
+                async with new_session() as session:
+                    assert result == await sql_top(session, k)
+
+        # 淘汰与回表都确实发生过，且候选集只有 4 人时也不会每次都回表
+        assert trims > 0
+        assert 1 < reloads < 200
+
+    run_db(main)
+
+
+def test_get_top_follows_committed_transfers_only(run_db):
+    rng = random.Random(1)
+    capitalists.invalidate()
+
+    async def main():
+        await seed_users(rng)
+        for step in range(500):
+            a, b = rng.sample(range(USERS), 2)
+            amount = rng.randint(1, 800)
+            async with new_session() as session:
+                try:
+                    await ledger.transfer(session, str(a), str(b), amount, type=TransactionType.GIVE, description='test')
+                except ledger.InsufficientCoins:
+                    continue
+                if step % 10 == 0:
+                    await session.rollback()
+                else:
+                    await session.commit()
+
+            async with new_session() as session:
+                assert await capitalists.get_top(session) == await sql_top(session, capitalists.TOP_K)
+
+    run_db(main)
+    capitalists.invalidate()
@@ -0,0 +1,198 @@
+import asyncio
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import pytest
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+
+from src.plugins.axekz.core.db.deps import new_session
+from src.plugins.axekz.core.db.models import KZGlobalRecord, KZGlobalSync
+from src.plugins.axekz.core.utils import globalapi
+
+STEAMID64 = '76561198000000001'
+MODE = 'kz_timer'
+
+
+class FakeGlobalAPI:
+    """
+    records/top 与 records/top/recent 的本地替身，可作为 sync_personal_records 的 fetch 参数。
+    created_since 只返回 updated_on 晚于该时间的记录。
+    """
+
+    def __init__(self, records: list[dict]):
+        self.records = list(records)
+        self.calls: list[tuple[str, dict]] = []
+
+    async def __call__(self, url, params=None):
+        params = params or {}
+        endpoint = urlsplit(url).path.split('/api/v2.0/')[1]
+        self.calls.append((endpoint, params))
+
+        records = [
+            r for r in self.records
+            if str(r['steamid64']) == params['steamid64'] and r['mode'] == params['modes_list_string']
+        ]
+        if 'has_teleports' in params:
+            records = [r for r in records if (r['teleports'] > 0) == (params['has_teleports'] == 'true')]
+        if 'created_since' in params:
+            since = datetime.fromisoformat(params['created_since'])
+            records = [r for r in records if datetime.fromisoformat(r['updated_on']) > since]
+        return [tuple(r.get(field) for field in globalapi.MIRROR_FIELDS) for r in records]
+
+
+def record(record_id, map_name, teleports, server_id, updated_on):
+    return {
+        'id': record_id,
+        'steamid64': int(STEAMID64),
+        'player_name': 'player',
+        'map_name': map_name,
+        'mode': MODE,
+        'teleports': teleports,
+        'server_id': server_id,
+        'time': 60.0 + record_id,
+        'points': 900,
+        'updated_on': updated_on,
+    }
+
+
+async def sqlite_upsert_kz_records(session, rows):
+    if not rows:
+        return
+    stmt = sqlite_insert(KZGlobalRecord).values(rows)
+    columns = ('record_id', 'player_name', 'server_id', 'teleports', 'time', 'points', 'updated_on')
+    await session.exec(stmt.on_conflict_do_update(
+        index_elements=['steamid64', 'mode', 'map_name', 'has_teleports'],
+        set_={column: stmt.excluded[column] for column in columns},
+    ))
+
+
+async def sqlite_mark_kz_synced(session, steamid64, mode, synced_at):
+    stmt = sqlite_insert(KZGlobalSync).values(steamid64=steamid64, mode=mode, synced_at=synced_at)
+    await session.exec(stmt.on_conflict_do_update(
+        index_elements=['steamid64', 'mode'], set_={'synced_at': stmt.excluded.synced_at},
+    ))
+
+
+@pytest.fixture(autouse=True)
+def sqlite_upserts(monkeypatch):
+    # crud 中的 upsert 使用 MySQL 的 ON DUPLICATE KEY UPDATE
+    monkeypatch.setattr(globalapi, 'upsert_kz_records', sqlite_upsert_kz_records)
+    monkeypatch.setattr(globalapi, 'mark_kz_synced', sqlite_mark_kz_synced)
+
+
+async def stored_records() -> dict[tuple[str, bool], int]:
+    async with new_session() as session:
+        rows = (await session.exec(select(KZGlobalRecord))).all()
+    return {(r.map_name, r.has_teleports): r.record_id for r in rows}
+
+
+def test_incremental_sync_only_pulls_newer_records(run_db):
+    api = FakeGlobalAPI([
+        record(1, 'kz_a', 3, 1683, '2024-01-01T00:00:00'),
+        record(2, 'kz_b', 0, 1633, '2024-02-01T00:00:00'),
+    ])
+
+    async def main():
+        await globalapi.sync_personal_records(STEAMID64, MODE, fetch=api)
+        assert [(endpoint, params.get('has_teleports')) for endpoint, params in api.calls] == [
+            ('records/top', 'true'), ('records/top', 'false'),
+        ]
+        assert await stored_records() == {('kz_a', True): 1, ('kz_b', False): 2}
+
+        # TTL 内不再请求
+        await globalapi.sync_personal_records(STEAMID64, MODE, fetch=api)
+        assert len(api.calls) == 2
+
+        api.records += [
+            record(3, 'kz_a', 1, 1393, '2024-03-01T00:00:00'),
+            record(4, 'kz_c', 0, 1683, '2024-03-02T00:00:00'),
+        ]
+        api.calls.clear()
+        served = []
+
+        async def spy(url, params=None):
+            rows = await api(url, params=params)
+            served.extend(rows)
+            return rows
+
+        await globalapi.sync_personal_records(STEAMID64, MODE, update=True, fetch=spy)
+
+        (endpoint, params), = api.calls
+        assert endpoint == 'records/top/recent'
+        assert params['created_since'] == '2024-02-01T00:00:00'
+        assert sorted(row[0] for row in served) == [3, 4]
+        assert await stored_records() == {('kz_a', True): 3, ('kz_b', False): 2, ('kz_c', False): 4}
+
+    run_db(main)
+
+
+def test_fetch_personal_recent_returns_record_dict(run_db):
+    api = FakeGlobalAPI([
+        record(1, 'kz_a', 3, 1683, '2024-01-01T00:00:00'),
+        record(2, 'kz_b', 0, 1633, '2024-02-01T00:00:00'),
+    ])
+
+    async def main():
+        recent = await globalapi.fetch_personal_recent(STEAMID64, MODE, fetch=api)
+        assert recent['id'] == 2
+        assert recent['map_name'] == 'kz_b'
+        assert recent['teleports'] == 0
+        assert recent['updated_on'] == '2024-02-01T00:00:00'
+        assert recent['created_on_datetime'] == datetime(2024, 2, 1)
+
+    run_db(main)
+
+
+def test_sync_holds_no_session_while_fetching(run_db, monkeypatch):
+    api = FakeGlobalAPI([record(1, 'kz_a', 3, 1683, '2024-01-01T00:00:00')])
+    open_sessions = 0
+    session_factory = globalapi.new_session
+
+    class TrackedSession:
+        def __init__(self):
+            self._session = session_factory()
+
+        async def __aenter__(self):
+            nonlocal open_sessions
+            open_sessions += 1
+            return await self._session.__aenter__()
+
+        async def __aexit__(self, *exc):
+            nonlocal open_sessions
+            open_sessions -= 1
+            return await self._session.__aexit__(*exc)
+
+    async def fetch(url, params=None):
+        assert open_sessions == 0
+        return await api(url, params=params)
+
+    monkeypatch.setattr(globalapi, 'new_session', TrackedSession)
+
+    async def main():
+        await globalapi.sync_personal_records(STEAMID64, MODE, fetch=fetch)
+        await globalapi.sync_personal_records(STEAMID64, MODE, update=True, fetch=fetch)
+        assert len(api.calls) == 3
+        assert open_sessions == 0
+
+    run_db(main)
+
+
+def test_full_record_lists_use_the_small_cache(monkeypatch):
+    async def fake_get(url, params=None):
+        return [{'steamid64': params['steamid64'], 'map_name': params.get('map_name', 'kz_a')}]
+
+    monkeypatch.setattr(globalapi, 'aio_get', fake_get)
+    globalapi.cache.clear()
+    globalapi.records_cache.clear()
+
+    async def main():
+        for i in range(globalapi.records_cache.maxsize + 3):
+            await globalapi.fetch_global_stats(f'7656119800000{i:04d}', MODE)
+        await globalapi.fetch_personal_best(STEAMID64, 'kz_a', MODE)
+
+    asyncio.run(main())
+    assert len(globalapi.records_cache) == globalapi.records_cache.maxsize
+    assert len(globalapi.cache) == 1
+    globalapi.cache.clear()
+    globalapi.records_cache.clear()
@@ -0,0 +1,193 @@
+import pytest
+from sqlalchemy import event
+from sqlmodel import select, delete
+
+from src.plugins.axekz.core import BANK_QID, capitalists, ledger
+from src.plugins.axekz.core.db import deps
+from src.plugins.axekz.core.db.deps import new_session
+from src.plugins.axekz.core.db.migrations import BANK_SHARDS
+from src.plugins.axekz.core.db.models import User, BankShard, CoinTransaction, TransactionType
+
+BANK_COINS = 10 ** 6
+
+
+@pytest.fixture(autouse=True)
+def reset_capitalists():
+    capitalists.invalidate()
+    yield
+    capitalists.invalidate()
+
+
+async def seed(coins: dict[str, int]):
+    async with new_session() as session:
+        session.add(User(qid=BANK_QID, steamid='bank', coins=BANK_COINS))
+        session.add_all([BankShard(shard=i) for i in range(BANK_SHARDS)])
+        session.add_all([User(qid=qid, steamid=f's{qid}', coins=c) for qid, c in coins.items()])
+        await session.commit()
+
+
+async def balances() -> dict[str, int]:
+    async with new_session() as session:
+        return dict((await session.exec(select(User.qid, User.coins))).all())
+
+
+async def ledger_rows() -> list[tuple[str, int, str]]:
+    async with new_session() as session:
+        return list((await session.exec(
+            select(CoinTransaction.user_id, CoinTransaction.amount, CoinTransaction.description)
+            .order_by(CoinTransaction.id)
+        )).all())
+
+
+async def pending() -> dict[int, int]:
+    async with new_session() as session:
+        return dict((await session.exec(select(BankShard.shard, BankShard.pending).where(BankShard.pending != 0))).all())
+
+
+def user_updates() -> list[str]:
+    """记录之后对 qq_users 的 UPDATE 依次作用的 qid"""
+    updated = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE qq_users'):
+            updated.append(parameters[1])
+
+    event.listen(deps.engine.sync_engine, 'before_cursor_execute', record)
+    return updated
+
+
+def test_insufficient_coins_leaves_balances_and_ledger_untouched(run_db):
+    async def main():
+        await seed({'1': 100, '0': 50})
+        before = await balances()
+
+        async with new_session() as session:
+            # '0' 排在前面先被加款，'1' 的扣款条件不满足
+            with pytest.raises(ledger.InsufficientCoins) as excinfo:
+                await ledger.transfer(session, '1', '0', 150, type=TransactionType.GIVE, description='give', tax=15)
+            assert (excinfo.value.qid, excinfo.value.amount) == ('1', 150)
+            # 带条件的 UPDATE 没有改动扣款方
+            assert (await session.get(User, '1')).coins == 100
+            await session.rollback()
+
+        async with new_session() as session:
+            with pytest.raises(ledger.InsufficientCoins):
+                await ledger.transfer(session, '0', '0', 51, type=TransactionType.GIVE, description='self')
+            await session.rollback()
+
+        assert await balances() == before
+        assert await ledger_rows() == []
+        assert await pending() == {}
+
+    run_db(main)
+
+
+def test_tax_split_and_ledger_records(run_db, monkeypatch):
+    monkeypatch.setattr(ledger.random, 'randrange', lambda n: 3)
+
+    async def main():
+        await seed({'a': 500, 'b': 0})
+        async with new_session() as session:
+            result = await ledger.transfer(
+                session, 'a', 'b', 200, type=TransactionType.GIVE, tax=20,
+                description='打赏 b', to_description='收到 a 的打赏', tax_description='打赏税',
+            )
+            await session.commit()
+
+        assert (result.from_balance, result.to_balance) == (300, 180)
+        assert await balances() == {BANK_QID: BANK_COINS, 'a': 300, 'b': 180}
+        assert await pending() == {3: 20}
+        assert await ledger_rows() == [
+            ('a', -200, '打赏 b'),
+            ('b', 180, '收到 a 的打赏'),
+            (ledger.BANK_LEDGER_ID, 20, '打赏税'),
+        ]
+
+        async with new_session() as session:
+            assert await ledger.get_bank_balance(session) == BANK_COINS + 20
+        assert await ledger.fold_bank() == 20
+        assert await pending() == {}
+        assert (await balances())[BANK_QID] == BANK_COINS + 20
+
+    run_db(main)
+
+
+def test_updates_users_in_sorted_qid_order(run_db):
+    async def main():
+        await seed({'9': 1000, '10': 1000, '100': 1000})
+        updated = user_updates()
+
+        async with new_session() as session:
+            await ledger.transfer(session, '9', '10', 100, type=TransactionType.GIVE, description='give', tax=10)
+            await ledger.transfer(session, '10', '9', 100, type=TransactionType.GIVE, description='give')
+            await ledger.transfer(session, '100', '10', 50, type=TransactionType.GIVE, description='give')
+            await session.commit()
+        assert updated == ['10', '9', '10', '9', '10', '100']
+        assert await balances() == {BANK_QID: BANK_COINS, '9': 1000, '10': 1040, '100': 950}
+
+    run_db(main)
+
+
+def test_self_transfer_pays_only_tax(run_db):
+    async def main():
+        await seed({'a': 100})
+        updated = user_updates()
+
+        async with new_session() as session:
+            result = await ledger.transfer(session, 'a', 'a', 100, type=TransactionType.GIVE, description='self', tax=7)
+            await session.commit()
+
+        # 扣款与加款合并为一条 UPDATE，仍要求余额足够支付全额
+        assert updated == ['a']
+        assert result.from_balance == result.to_balance == 93
+        assert (await balances())['a'] == 93
+        assert [(qid, amount) for qid, amount, _ in await ledger_rows()] == [
+            ('a', -100), ('a', 93), (ledger.BANK_LEDGER_ID, 7),
+        ]
+        assert sum((await pending()).values()) == 7
+
+    run_db(main)
+
+
+def test_transfer_to_bank_credits_a_shard(run_db, monkeypatch):
+    shards = iter([5, 11])
+    monkeypatch.setattr(ledger.random, 'randrange', lambda n: next(shards))
+
+    async def main():
+        await seed({'a': 1000})
+        updated = user_updates()
+
+        async with new_session() as session:
+            result = await ledger.transfer(session, 'a', BANK_QID, 300, type=TransactionType.PURCHASE,
+                                           description='购买', tax=30)
+            await ledger.transfer(session, None, 'a', 40, type=TransactionType.SIGN, description='签到', tax=4)
+            await session.commit()
+
+        # 不锁银行用户行，收入全部进入分片
+        assert updated == ['a', 'a']
+        assert result.to_balance is None
+        assert await balances() == {BANK_QID: BANK_COINS, 'a': 736}
+        assert await pending() == {5: 300, 11: 4}
+        assert [(qid, amount) for qid, amount, _ in await ledger_rows()] == [
+            ('a', -300), (ledger.BANK_LEDGER_ID, 300), ('a', 36), (ledger.BANK_LEDGER_ID, 4),
+        ]
+
+    run_db(main)
+
+
+def test_missing_bank_shard_fails_the_transfer(run_db):
+    async def main():
+        await seed({'a': 100, 'b': 0})
+        async with new_session() as session:
+            await session.exec(delete(BankShard))
+            await session.commit()
+
+        async with new_session() as session:
+            with pytest.raises(RuntimeError):
+                await ledger.transfer(session, 'a', 'b', 50, type=TransactionType.GIVE, description='give', tax=5)
+            await session.rollback()
+
+        assert await balances() == {BANK_QID: BANK_COINS, 'a': 100, 'b': 0}
+        assert await ledger_rows() == []
+
+    run_db(main)
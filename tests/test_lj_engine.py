@@ -0,0 +1,82 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.plugins.axekz.core import lj_engine
+from src.plugins.axekz.plugins.long_jump import LJSampleBuffer
+
+MEAN = np.array([250.0, 276.0, 300.0, 6.0, 80.0])
+STD = np.array([6.0, 4.0, 8.0, 1.5, 6.0])
+# distance 与 pre、max 正相关
+CORR = np.array([
+    [1.0, 0.6, 0.5, 0.1, 0.3],
+    [0.6, 1.0, 0.4, 0.0, 0.1],
+    [0.5, 0.4, 1.0, 0.1, 0.2],
+    [0.1, 0.0, 0.1, 1.0, 0.0],
+    [0.3, 0.1, 0.2, 0.0, 1.0],
+])
+
+
+def make_jumpstats(n=5000, seed=1) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    x = rng.multivariate_normal(MEAN, CORR * np.outer(STD, STD), size=n)
+    return [
+        {'Distance': d, 'Pre': p, 'Max': m, 'Strafes': round(s), 'Sync': y}
+        for d, p, m, s, y in x
+    ]
+
+
+def fitted_engine(seed=42, distances=()) -> lj_engine.LJEngine:
+    engine = lj_engine.LJEngine(seed=seed)
+    engine.fit('kzt', make_jumpstats(), distances)
+    return engine
+
+
+def test_same_seed_gives_same_samples():
+    assert fitted_engine(seed=7).sample('kzt', 1000) == fitted_engine(seed=7).sample('kzt', 1000)
+    assert fitted_engine(seed=7).sample('kzt', 1000) != fitted_engine(seed=8).sample('kzt', 1000)
+
+
+def test_samples_match_source_distribution():
+    source = np.array([list(row.values()) for row in make_jumpstats()])
+    x = fitted_engine().sample_array('kzt', 200_000)
+
+    assert np.allclose(x.mean(axis=0), source.mean(axis=0), rtol=0.01)
+    assert np.allclose(x.std(axis=0), source.std(axis=0), rtol=0.05)
+    assert np.corrcoef(x[:, 0], x[:, 1])[0, 1] == pytest.approx(np.corrcoef(source[:, 0], source[:, 1])[0, 1], abs=0.03)
+    assert (x >= source.min(axis=0)).all() and (x <= source.max(axis=0)).all()
+    assert (x[:, 3] == np.rint(x[:, 3])).all()
+
+
+def test_ljpk_history_replaces_distance_marginal():
+    history = np.random.default_rng(3).normal(240.0, 3.0, size=2000)
+    x = fitted_engine(distances=history).sample_array('kzt', 200_000)
+
+    assert x[:, 0].mean() == pytest.approx(history.mean(), abs=0.1)
+    assert x[:, 0].std() == pytest.approx(history.std(ddof=1), rel=0.05)
+    # 替换距离分布后仍保留与 pre 的相关性
+    assert np.corrcoef(x[:, 0], x[:, 1])[0, 1] > 0.5
+
+
+def test_sample_returns_casual_lj_records():
+    record, = fitted_engine().sample('kzt', 1)
+    assert set(record) == set(lj_engine.FIELDS)
+    assert isinstance(record['strafes'], int)
+
+
+def test_buffer_draws_from_engine_in_batches():
+    engine = fitted_engine()
+    buffer = LJSampleBuffer(engine_batch_size=500)
+    buffer.use_engine(engine)
+
+    calls = []
+    sample = engine.sample
+    engine.sample = lambda mode, n: calls.append(n) or sample(mode, n)
+
+    async def main():
+        return [await buffer.take('kzt') for _ in range(300)]
+
+    taken = asyncio.run(main())
+    assert len(taken) == 300 and all(len(pair) == 2 for pair in taken)
+    assert calls == [500, 500]
@@ -0,0 +1,161 @@
+import random
+
+import pytest
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select, func
+
+from src.plugins.axekz.core.db import crud
+from src.plugins.axekz.core.db.crud import LJPKStats
+from src.plugins.axekz.core.db.deps import new_session
+from src.plugins.axekz.core.db.models import User, LJPKRecord, LJPKPlayerStats
+
+USERS = 8
+MODES = ('kzt', 'skz')
+
+
+def sqlite_ljpk_stats_upsert(qid, mode, won, bet_amount, distance):
+    # 与 crud._ljpk_stats_upsert 相同，ON DUPLICATE KEY UPDATE / GREATEST 换成 SQLite 的写法
+    stmt = sqlite_insert(LJPKPlayerStats).values(
+        qid=qid,
+        mode=mode,
+        matches=1,
+        wins=int(won),
+        coins_won=bet_amount if won else 0,
+        coins_lost=0 if won else bet_amount,
+        net_coins=bet_amount if won else -bet_amount,
+        distance_sum=distance,
+        best_distance=distance,
+    )
+    return stmt.on_conflict_do_update(index_elements=['qid', 'mode'], set_=dict(
+        matches=LJPKPlayerStats.matches + stmt.excluded.matches,
+        wins=LJPKPlayerStats.wins + stmt.excluded.wins,
+        coins_won=LJPKPlayerStats.coins_won + stmt.excluded.coins_won,
+        coins_lost=LJPKPlayerStats.coins_lost + stmt.excluded.coins_lost,
+        net_coins=LJPKPlayerStats.net_coins + stmt.excluded.net_coins,
+        distance_sum=LJPKPlayerStats.distance_sum + stmt.excluded.distance_sum,
+        best_distance=func.max(LJPKPlayerStats.best_distance, stmt.excluded.best_distance),
+        updated_at=func.current_timestamp(),
+    ))
+
+
+@pytest.fixture(autouse=True)
+def sqlite_upsert(monkeypatch):
+    monkeypatch.setattr(crud, '_ljpk_stats_upsert', sqlite_ljpk_stats_upsert)
+
+
+def legacy_stats(records: list[LJPKRecord], qid: str, nickname: str) -> LJPKStats:
+    """累计表之前的做法：逐条遍历该玩家的对局记录"""
+    total_matches = wins = net_coins = 0
+    total_distance = 0.0
+    for r in records:
+        if qid not in (r.qid1, r.qid2):
+            continue
+        total_matches += 1
+        total_distance += r.distance1 if r.qid1 == qid else r.distance2
+        if r.winner_qid == qid:
+            wins += 1
+            net_coins += r.bet_amount
+        else:
+            net_coins -= r.bet_amount
+    if not total_matches:
+        return LJPKStats(nickname=nickname, winrate=0.00, net_coins=0, avg_distance=0.0000, total_matches=0)
+    return LJPKStats(
+        nickname=nickname,
+        winrate=round(wins / total_matches * 100, 2),
+        net_coins=net_coins,
+        avg_distance=round(total_distance / total_matches, 4),
+        total_matches=total_matches,
+    )
+
+
+def legacy_top(records: list[LJPKRecord], nicknames: dict[str, str], mode: str, reverse: bool) -> list[LJPKStats]:
+    records = [r for r in records if r.mode == mode]
+    stats = [legacy_stats(records, qid, nickname) for qid, nickname in nicknames.items()]
+    return sorted((s for s in stats if s.total_matches), key=lambda s: s.net_coins, reverse=not reverse)
+
+
+def assert_same(actual: LJPKStats, expected: LJPKStats):
+    assert (actual.nickname, actual.total_matches, actual.net_coins) == \
+           (expected.nickname, expected.total_matches, expected.net_coins)
+    assert actual.winrate == pytest.approx(expected.winrate, abs=0.01)
+    assert actual.avg_distance == pytest.approx(expected.avg_distance, abs=1e-4)
+
+
+def assert_same_top(actual: list[LJPKStats], expected: list[LJPKStats]):
+    # 净胜硬币并列时顺序不确定：逐位比较净胜硬币，整体比较各玩家数据
+    assert [s.net_coins for s in actual] == [s.net_coins for s in expected]
+    by_name = {s.nickname: s for s in expected}
+    assert sorted(s.nickname for s in actual) == sorted(by_name)
+    for s in actual:
+        assert_same(s, by_name[s.nickname])
+
+
+def random_match(rng, nicknames) -> LJPKRecord:
+    qid1, qid2 = rng.sample(sorted(nicknames), 2)
+    distance1, distance2 = round(rng.uniform(230, 290), 4), round(rng.uniform(230, 290), 4)
+    return LJPKRecord(
+        qid1=qid1,
+        qid2=qid2,
+        distance1=distance1,
+        distance2=distance2,
+        # 0 / -1 为踢人、禁言的免金币场
+        bet_amount=rng.choice([-1, 0, rng.randint(1, 500)]),
+        mode=rng.choice(MODES),
+        winner_qid=qid1 if distance1 > distance2 else qid2,
+    )
+
+
+async def assert_matches_legacy(records, nicknames):
+    for qid, nickname in nicknames.items():
+        assert_same(await crud.get_ljpk_stats(qid), legacy_stats(records, qid, nickname))
+        for mode in MODES:
+            by_mode = [r for r in records if r.mode == mode]
+            assert_same(await crud.get_ljpk_stats(qid, mode), legacy_stats(by_mode, qid, nickname))
+
+    for mode in MODES:
+        for reverse in (False, True):
+            assert_same_top(
+                await crud.get_top_ljpk_players(limit=None, reverse=reverse, mode=mode),
+                legacy_top(records, nicknames, mode, reverse),
+            )
+        top3 = await crud.get_top_ljpk_players(limit=3, mode=mode)
+        assert [s.net_coins for s in top3] == [s.net_coins for s in legacy_top(records, nicknames, mode, False)[:3]]
+
+    async with new_session() as session:
+        best = {(s.qid, s.mode): s.best_distance for s in (await session.exec(select(LJPKPlayerStats))).all()}
+    expected = {}
+    for r in records:
+        for qid, distance in ((r.qid1, r.distance1), (r.qid2, r.distance2)):
+            expected[(qid, r.mode)] = max(expected.get((qid, r.mode), 0), distance)
+    assert best == expected
+
+
+def test_rebuild_and_incremental_stats_match_legacy_aggregation(run_db):
+    rng = random.Random(0)
+    # 最后一名玩家没有任何对局
+    nicknames = {str(10000 + i): f'player{i}' for i in range(USERS)}
+    players = dict(list(nicknames.items())[:-1])
+
+    async def main():
+        history = [random_match(rng, players) for _ in range(300)]
+        async with new_session() as session:
+            session.add_all([User(qid=qid, steamid=f's{qid}', nickname=name) for qid, name in nicknames.items()])
+            session.add_all(history)
+            await session.commit()
+
+        assert await crud.rebuild_ljpk_player_stats(chunk_size=64) == len(history)
+        await assert_matches_legacy(history, nicknames)
+
+        for _ in range(150):
+            match = random_match(rng, players)
+            async with new_session() as session:
+                await crud.record_ljpk_match(session, match)
+                await session.commit()
+            history.append(match)
+        await assert_matches_legacy(history, nicknames)
+
+        # 重建结果与增量维护的结果一致
+        assert await crud.rebuild_ljpk_player_stats() == len(history)
+        await assert_matches_legacy(history, nicknames)
+
+    run_db(main)
@@ -0,0 +1,29 @@
+from src.plugins.axekz.core.betting import OptionNameIndex
+from src.plugins.axekz.core.db.models import BetOption
+
+
+def option(option_id, name, cancelled=False):
+    return BetOption(option_id=option_id, event_id=1, option_name=name, qid=str(option_id), steamid='s',
+                     is_cancelled=cancelled)
+
+
+def names(options):
+    return [o.option_name for o in options]
+
+
+def test_match_order():
+    index = OptionNameIndex([option(1, 'Zed'), option(2, 'zedd'), option(3, '张三'), option(4, '李四', cancelled=True)])
+
+    assert names(index.match('ZED')) == ['Zed']  # 完全匹配优先，不因 zedd 产生歧义
+    assert names(index.match('ze')) == ['Zed', 'zedd']
+    assert names(index.match('张')) == ['张三']
+    assert names(index.match('ZS')) == ['张三']  # 拼音首字母
+    assert names(index.match('李')) == []  # 已退出的选手不参与匹配
+
+
+def test_add_reactivated_option_once():
+    index = OptionNameIndex([option(4, '李四', cancelled=True)])
+    reactivated = option(4, '李四')
+    index.add(reactivated)
+    index.add(reactivated)
+    assert names(index.match('ls')) == ['李四']